@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+# Benchmarks always run without a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame as pg
+
+import graph_constructor
+from classes import CoordinateSystem, Scene
+from graphs import create_graph
+from sweep import Sweep
+from tiles import TileCache
+
+Results = Dict[str, Dict[str, float]]
+
+
+def time_stage(function: Callable[[], object],
+               repeat: int) -> Dict[str, float]:
+    """
+    Times a stage several times.
+
+    :param function: The stage to run.
+    :param repeat: Number of timed runs.
+    :return: Mean, median, min and max run time in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"mean_ms": statistics.fmean(timings),
+            "median_ms": statistics.median(timings),
+            "min_ms": min(timings), "max_ms": max(timings),
+            "repeat": repeat}
+
+
+def curve_definitions(n_curves: int, n_samples: int) -> List[tuple]:
+    """
+    Builds synthetic parametric definitions of Lissajous-like curves.
+
+    :param n_curves: Number of curves.
+    :param n_samples: Number of samples per curve at the declared dt.
+    :return: Definitions in the format returned by get_input.
+    """
+    t_range = (0, 2 * np.pi)
+    dt = (t_range[1] - t_range[0]) / (n_samples - 1)
+    return [("parametric", f"{1 + k % 7} * math.cos({1 + k % 5} * t)",
+             f"{1 + k % 3} * math.sin({2 + k % 4} * t)", "BLUE", t_range, dt)
+            for k in range(n_curves)]
+
+
+def spiral_definitions(n_spirals: int, turns: int) -> List[tuple]:
+    """
+    Builds synthetic dense spiral definitions.
+
+    :param n_spirals: Number of spirals.
+    :param turns: Number of turns of each spiral.
+    :return: Definitions in the format returned by get_input.
+    """
+    return [("parametric", f"(0.01 * t + {k * 0.1}) * math.cos(t)",
+             f"(0.01 * t + {k * 0.1}) * math.sin(t)", "RED",
+             (0, turns * 2 * np.pi), 0.001)
+            for k in range(n_spirals)]
+
+
+def scattered_definitions(n_curves: int, extent: float) -> List[tuple]:
+    """
+    Builds synthetic definitions of small circles scattered over a large
+    square of the plane.
+
+    :param n_curves: Number of circles.
+    :param extent: Half the side of the square in world units.
+    :return: Definitions in the format returned by get_input.
+    """
+    centers = np.random.default_rng(0).uniform(-extent, extent,
+                                               (n_curves, 2))
+    return [("parametric", f"{x:.3f} + 0.5 * math.cos(t)",
+             f"{y:.3f} + 0.5 * math.sin(t)", "GREEN", (0, 2 * np.pi), 0.05)
+            for x, y in centers]
+
+
+def fourier_definitions(n_curves: int, n_terms: int) -> List[tuple]:
+    """
+    Builds synthetic definitions of truncated Fourier series, all over
+    the same t range and sharing the same harmonics.
+
+    :param n_curves: Number of curves.
+    :param n_terms: Number of harmonics of each coordinate.
+    :return: Definitions in the format returned by get_input.
+    """
+    coefficients = np.random.default_rng(0).normal(size=(n_curves, 2,
+                                                         n_terms))
+    return [("parametric",
+             " + ".join(f"{a:.3f} * math.cos({k + 1} * t)"
+                        for k, a in enumerate(x_coefficients)),
+             " + ".join(f"{b:.3f} * math.sin({k + 1} * t)"
+                        for k, b in enumerate(y_coefficients)),
+             "BLUE", (0, 2 * np.pi), 0.001)
+            for x_coefficients, y_coefficients in coefficients]
+
+
+def sweep_definitions(n_curves: int) -> List[tuple]:
+    """
+    Builds synthetic definitions of curve families over two parameters.
+
+    :param n_curves: Number of curves.
+    :return: Definitions in the format returned by get_input.
+    """
+    parameters = (("a", 0.5, 3.0), ("b", 1.0, 4.0))
+    return [("standard", f"a * math.sin(b * x + {k * 0.2})", "BLUE",
+             (-100, 100), parameters) if k % 2 else
+            ("parametric", f"a * math.cos(t + {k * 0.1})",
+             "math.sin(b * t)", "RED", (0, 2 * np.pi), 0.01, parameters)
+            for k in range(n_curves)]
+
+
+def scene_stages(definitions: List[tuple], repeat: int) -> Results:
+    """
+    Times building, sampling, projecting and drawing a scene.
+
+    :param definitions: Graph definitions to load.
+    :param repeat: Number of timed runs per stage.
+    :return: Timings per stage.
+    """
+    surface = pg.Surface((graph_constructor.WIDTH, graph_constructor.HEIGHT))
+    axes = CoordinateSystem()
+
+    def build() -> Scene:
+        return Scene([create_graph(definition) for definition in definitions])
+
+    def sample() -> None:
+        scene = build()
+        scene.project(axes)
+
+    scene = build()
+    scene.project(axes)
+
+    def project() -> None:
+        scene.projection = None
+        scene.project(axes)
+
+    return {"build": time_stage(build, repeat),
+            "build_and_sample": time_stage(sample, repeat),
+            "project": time_stage(project, repeat),
+            "draw_curves": time_stage(lambda: scene.draw(axes, surface),
+                                      repeat)}
+
+
+def axes_stages(extra_grid: bool, repeat: int) -> Results:
+    """
+    Times rendering the axes layer from scratch and from the cache.
+
+    :param extra_grid: Whether the extra grid is shown.
+    :param repeat: Number of timed runs per stage.
+    :return: Timings per stage.
+    """
+    surface = pg.Surface((graph_constructor.WIDTH, graph_constructor.HEIGHT))
+    axes = CoordinateSystem()
+    axes.extra_grid_flag = extra_grid
+
+    def uncached() -> None:
+        axes.rendered_key = None
+        axes.draw(surface)
+
+    return {"draw_axes": time_stage(uncached, repeat),
+            "draw_axes_cached": time_stage(lambda: axes.draw(surface),
+                                           repeat)}
+
+
+def navigation_stages(definitions: List[tuple], steps: int,
+                      tiles: bool = False) -> Results:
+    """
+    Times full frames (draw_all) over a pan and zoom sequence.
+
+    :param definitions: Graph definitions to load.
+    :param steps: Number of frames in each direction.
+    :param tiles: Whether to draw the curves from a tile cache.
+    :return: Timings of the pan and zoom frames.
+    """
+    scene = Scene([create_graph(definition) for definition in definitions],
+                  tiles=TileCache(prefetch=False) if tiles else None)
+    axes = CoordinateSystem()
+    graph_constructor.draw_all(axes, scene)
+
+    def pan() -> None:
+        axes.x_0 += axes.x_unit
+        graph_constructor.draw_all(axes, scene)
+
+    def zoom() -> None:
+        axes.x_unit *= 2
+        axes.y_unit *= 2
+        if axes.x_unit > 640:
+            axes.x_unit = axes.y_unit = 20
+        graph_constructor.draw_all(axes, scene)
+
+    stages = {"pan_frame": time_stage(pan, steps),
+              "zoom_frame": time_stage(zoom, steps)}
+    scene.close()
+    return stages
+
+
+def sweep_stages(definitions: List[tuple], steps: int) -> Results:
+    """
+    Times full frames (draw_all) while a parameter sweep moves a
+    parameter of every curve on each frame.
+
+    :param definitions: Graph definitions to load.
+    :param steps: Number of frames.
+    :return: Timings of the sweep frames.
+    """
+    scene = Scene([create_graph(definition) for definition in definitions])
+    axes = CoordinateSystem()
+    sweep = Sweep()
+    sweep.update(scene.graphs)
+    sweep.playing = True
+    graph_constructor.draw_all(axes, scene, sweep)
+
+    def frame() -> None:
+        sweep.advance(1 / 60)
+        scene.set_values(sweep.values)
+        graph_constructor.draw_all(axes, scene, sweep)
+
+    stages = {"sweep_frame": time_stage(frame, steps)}
+    scene.close()
+    return stages
+
+
+def workloads(quick: bool) -> Dict[str, Callable[[int], Results]]:
+    """
+    Lists the benchmark workloads.
+
+    :param quick: Use smaller workloads, e.g., for a smoke test.
+    :return: Workload names mapped to functions that take the number of
+             timed runs and return stage timings.
+    """
+    scale = 10 if quick else 1
+    return {
+        "curves_10x1000": lambda repeat: scene_stages(
+            curve_definitions(10, 1000), repeat),
+        "curves_100x10000": lambda repeat: scene_stages(
+            curve_definitions(100 // scale, 10000), repeat),
+        "dense_spirals": lambda repeat: scene_stages(
+            spiral_definitions(10 // scale or 1, 50), repeat),
+        "axes": lambda repeat: axes_stages(False, repeat),
+        "axes_extra_grid": lambda repeat: axes_stages(True, repeat),
+        "pan_zoom": lambda repeat: navigation_stages(
+            curve_definitions(50 // scale, 5000), 4 * repeat),
+        "pan_zoom_tiles": lambda repeat: navigation_stages(
+            curve_definitions(50 // scale, 5000), 4 * repeat, tiles=True),
+        "scattered": lambda repeat: navigation_stages(
+            scattered_definitions(5000 // scale, 500), 4 * repeat),
+        "fourier": lambda repeat: scene_stages(
+            fourier_definitions(50 // scale, 20), repeat),
+        "sweep": lambda repeat: sweep_stages(
+            sweep_definitions(40 // scale), 4 * repeat),
+    }
+
+
+def run(names: List[str], quick: bool) -> dict:
+    """
+    Runs the selected workloads, recording timings and peak memory.
+
+    :param names: Workload names to run; all if empty.
+    :param quick: Use smaller workloads.
+    :return: The report as a JSON-serializable dict.
+    """
+    repeat = 3 if quick else 10
+    results = {}
+    for name, workload in workloads(quick).items():
+        if names and name not in names:
+            continue
+        stages = workload(repeat)
+        # tracemalloc slows allocations down, so memory is measured in a
+        # separate untimed run
+        tracemalloc.start()
+        workload(1)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {"stages": stages, "peak_memory_kb": peak / 1024}
+        print(f"{name}: " + ", ".join(
+            f"{stage} {timing['mean_ms']:.2f} ms"
+            for stage, timing in stages.items())
+            + f", peak {peak / 1024:.0f} KiB", file=sys.stderr)
+    return {"meta": {"python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "pygame": pg.version.ver,
+                     "machine": platform.machine(),
+                     "quick": quick},
+            "results": results}
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Compares mean stage timings against a saved baseline.
+
+    :param report: The current report.
+    :param baseline: A report saved earlier.
+    :param threshold: Ratio above which a stage counts as a regression.
+    :return: Descriptions of the regressed stages.
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        old_stages = baseline["results"].get(name, {}).get("stages", {})
+        for stage, timing in result["stages"].items():
+            old = old_stages.get(stage)
+            if old is None or old["mean_ms"] <= 0:
+                continue
+            ratio = timing["mean_ms"] / old["mean_ms"]
+            line = (f"{name}.{stage}: {old['mean_ms']:.2f} -> "
+                    f"{timing['mean_ms']:.2f} ms ({ratio:.2f}x)")
+            print(line, file=sys.stderr)
+            if ratio > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Command line entry point.
+
+    :param argv: Command line arguments.
+    :return: Exit status, 1 if a regression against the baseline was found.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python benchmark.py",
+        description="Benchmark sampling, projection and rendering.")
+    parser.add_argument("workloads", nargs="*",
+                        help="workloads to run (default: all)")
+    parser.add_argument("--quick", action="store_true",
+                        help="run smaller workloads")
+    parser.add_argument("--output", help="write the JSON report here "
+                                         "(default: stdout)")
+    parser.add_argument("--baseline", help="compare with this JSON report")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    # draw_all renders to the display surface, so open an invisible one
+    pg.init()
+    pg.display.set_mode((graph_constructor.WIDTH, graph_constructor.HEIGHT))
+    report = run(args.workloads, args.quick)
+    if args.output:
+        with open(args.output, mode="w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, mode="r") as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("Regressions:\n" + "\n".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
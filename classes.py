@@ -1,10 +1,39 @@
-import math
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pygame as pg
 
-from constants import (WIDTH, HEIGHT, BLACK, LIGHT_GREEN, GREY, dx, h1, h2, h3,
-                       screen)
+from constants import (WIDTH, HEIGHT, BLACK, WHITE, LIGHT_GREEN, GREY, h1, h2,
+                       h3, sample_margin, sweep_margin)
+from expressions import TermCache, share_terms
+from graphs import DataGraph, Graph, create_graph, expand_viewport
+from rendering import draw_graph
+from spatial import UNBOUNDED, GridIndex
+
+font = None
+label_cache = {}
+
+
+def get_font() -> pg.font.Font:
+    """Returns the shared label font, creating it on first use."""
+    global font
+    if font is None:
+        font = pg.font.Font(None, 24)
+    return font
+
+
+def render_label(text: str) -> pg.Surface:
+    """
+    Renders a label once and returns the cached surface afterwards.
+
+    :param text: The label text, e.g., "-3".
+    :return: The rendered label surface.
+    """
+    label = label_cache.get(text)
+    if label is None:
+        label = get_font().render(text, True, BLACK)
+        label_cache[text] = label
+    return label
 
 
 class CoordinateSystem:
@@ -12,7 +41,8 @@ class CoordinateSystem:
     notches, and gridlines."""
 
     def __init__(self, x_0: int = WIDTH // 2, y_0: int = HEIGHT // 2,
-                 x_unit: int = 40, y_unit: int = 40) -> None:
+                 x_unit: int = 40, y_unit: int = 40,
+                 width: int = WIDTH, height: int = HEIGHT) -> None:
         """
         Initializes the coordinate system with the given parameters.
 
@@ -20,7 +50,11 @@ class CoordinateSystem:
         :param y_0: The y-coordinate of the origin.
         :param x_unit: The unit length for the x-axis.
         :param y_unit: The unit length for the y-axis.
+        :param width: Width of the drawing surface in pixels.
+        :param height: Height of the drawing surface in pixels.
         """
+        self.width = width
+        self.height = height
         self.x_unit = x_unit
         self.y_unit = y_unit
         self.x_0 = x_0
@@ -28,6 +62,9 @@ class CoordinateSystem:
 
         self.extra_grid_flag = False
 
+        self.background = None
+        self.rendered_key = None
+
     @property
     def zero(self) -> tuple[int, int]:
         """Returns the coordinates of the origin as a tuple (x_0, y_0)."""
@@ -39,35 +76,43 @@ class CoordinateSystem:
         as a tuple (x_unit, y_unit)."""
         return self.x_unit, self.y_unit
 
+    @property
+    def viewport(self) -> tuple[float, float, float, float]:
+        """Returns the visible world window as (x_min, x_max, y_min, y_max)."""
+        return (-self.x_0 / self.x_unit,
+                (self.width - self.x_0) / self.x_unit,
+                (self.y_0 - self.height) / self.y_unit,
+                self.y_0 / self.y_unit)
+
     @property
     def dx_unit(self) -> int:
         """Returns the unit size for x-axis subdivisions."""
-        return self.x_unit // 10
+        return max(1, self.x_unit // 10)
 
     @property
     def dy_unit(self) -> int:
         """Returns the unit size for y-axis subdivisions."""
-        return self.y_unit // 10
+        return max(1, self.y_unit // 10)
 
     @property
     def n_x(self) -> int:
         """Returns the number of steps along the x-axis."""
-        return int(WIDTH // self.x_unit)
+        return int(self.width // self.x_unit)
 
     @property
     def n_y(self) -> int:
         """Returns the number of steps along the y-axis."""
-        return int(HEIGHT // self.y_unit)
+        return int(self.height // self.y_unit)
 
     @property
     def n_dx(self) -> int:
         """Returns the number of subdivisions along the x-axis."""
-        return int(WIDTH // self.dx_unit)
+        return int(self.width // self.dx_unit)
 
     @property
     def n_dy(self) -> int:
         """Returns the number of subdivisions along the y-axis."""
-        return int(HEIGHT // self.dy_unit)
+        return int(self.height // self.dy_unit)
 
     def notch_size(self, axis: float, axis_unit: int) -> int:
         """
@@ -87,204 +132,490 @@ class CoordinateSystem:
 
     @property
     def x_axis_values(self) -> list[float]:
-        """Returns a list of x-axis values based on the current x_unit."""
-        if self.x_unit < 40:
-            self.x_unit = 20
-        return [round(0 + k * self.x_unit, 1) for k in range(0, self.n_x + 1)]
+        """Returns a list of x-axis values based on the current x_unit,
+        aligned with the origin so that panning shifts the grid."""
+        start = self.x_0 % self.x_unit
+        return [round(start + k * self.x_unit, 1)
+                for k in range(0, self.n_x + 1)]
 
     @property
     def y_axis_values(self) -> list[float]:
-        """Returns a list of y-axis values based on the current y_unit."""
-        if self.y_unit < 40:
-            self.y_unit = 20
-        return [round(0 + k * self.y_unit, 1) for k in range(0, self.n_y + 1)]
+        """Returns a list of y-axis values based on the current y_unit,
+        aligned with the origin so that panning shifts the grid."""
+        start = self.y_0 % self.y_unit
+        return [round(start + k * self.y_unit, 1)
+                for k in range(0, self.n_y + 1)]
 
     @property
     def dx_axis_values(self) -> list[float]:
         """Returns a list of x-axis subdivision values."""
-        return [round(0 + k * self.dx_unit, 1)
+        start = self.x_0 % self.dx_unit
+        return [round(start + k * self.dx_unit, 1)
                 for k in range(0, self.n_dx + 1)]
 
     @property
     def dy_axis_values(self) -> list[float]:
         """Returns a list of y-axis subdivision values."""
-        return [round(0 + k * self.dy_unit, 1)
+        start = self.y_0 % self.dy_unit
+        return [round(start + k * self.dy_unit, 1)
                 for k in range(0, self.n_dy + 1)]
 
-    def draw_x_notch(self, x: int) -> None:
+    def draw_x_notch(self, surface: pg.Surface, x: int) -> None:
         """Draws a notch on the x-axis at the given position."""
-        size = self.notch_size(x, self.x_unit)
-        pg.draw.line(screen, BLACK, (x, self.y_0 - size),
+        size = self.notch_size(x - self.x_0, self.x_unit)
+        pg.draw.line(surface, BLACK, (x, self.y_0 - size),
                      (x, self.y_0 + size), 1)
 
-    def draw_y_notch(self, y: int) -> None:
+    def draw_y_notch(self, surface: pg.Surface, y: int) -> None:
         """Draws a notch on the y-axis at the given position."""
-        size = self.notch_size(y, self.y_unit)
-        pg.draw.line(screen, BLACK, (self.x_0 - size, y),
+        size = self.notch_size(y - self.y_0, self.y_unit)
+        pg.draw.line(surface, BLACK, (self.x_0 - size, y),
                      (self.x_0 + size, y), 1)
 
-    def draw_notches(self) -> None:
+    def draw_notches(self, surface: pg.Surface) -> None:
         """Draws all notches on both axes."""
-        [self.draw_x_notch(x) for x in self.dx_axis_values]
-        [self.draw_y_notch(y) for y in self.dy_axis_values]
+        [self.draw_x_notch(surface, x) for x in self.dx_axis_values]
+        [self.draw_y_notch(surface, y) for y in self.dy_axis_values]
 
-    def draw_x_grid(self, x: float, grid_color: tuple[int, int, int]) -> None:
+    def draw_x_grid(self, surface: pg.Surface, x: float,
+                    grid_color: tuple[int, int, int]) -> None:
         """Draws a vertical grid line at the given x-coordinate."""
-        pg.draw.line(screen, grid_color, (x, 0), (x, HEIGHT), 1)
+        pg.draw.line(surface, grid_color, (x, 0), (x, self.height), 1)
 
-    def draw_y_grid(self, y: float, grid_color: tuple[int, int, int]) -> None:
+    def draw_y_grid(self, surface: pg.Surface, y: float,
+                    grid_color: tuple[int, int, int]) -> None:
         """Draws a horizontal grid line at the given y-coordinate."""
-        pg.draw.line(screen, grid_color, (0, y), (WIDTH, y), 1)
+        pg.draw.line(surface, grid_color, (0, y), (self.width, y), 1)
 
-    def draw_grid(self) -> None:
+    def draw_grid(self, surface: pg.Surface) -> None:
         """Draws the primary grid lines using the LIGHT_GREEN color."""
-        [self.draw_x_grid(x, LIGHT_GREEN) for x in self.x_axis_values]
-        [self.draw_y_grid(y, LIGHT_GREEN) for y in self.y_axis_values]
+        [self.draw_x_grid(surface, x, LIGHT_GREEN) for x in self.x_axis_values]
+        [self.draw_y_grid(surface, y, LIGHT_GREEN) for y in self.y_axis_values]
 
-    def draw_extra_grid(self) -> None:
+    def draw_extra_grid(self, surface: pg.Surface) -> None:
         """Draws additional grid lines using the GREY color."""
-        [self.draw_x_grid(x, GREY) for x in self.dx_axis_values]
-        [self.draw_y_grid(y, GREY) for y in self.dy_axis_values]
+        [self.draw_x_grid(surface, x, GREY) for x in self.dx_axis_values]
+        [self.draw_y_grid(surface, y, GREY) for y in self.dy_axis_values]
 
-    def draw_x_labels(self) -> None:
+    def draw_x_labels(self, surface: pg.Surface) -> None:
         """Draws labels for the x-axis, excluding the zero."""
         label_step = max(1, round(40 / self.x_unit))
-        font = pg.font.Font(None, 24)
         for x in range(-self.n_x, self.n_x + 1):
             if x % label_step == 0 and x != 0:  # Skip zero
                 pixel_x = self.x_0 + x * self.x_unit
-                label = font.render(str(x), True, BLACK)
-                screen.blit(label,
-                            (pixel_x - label.get_width() // 2, self.y_0 + 10))
+                label = render_label(str(x))
+                surface.blit(label,
+                             (pixel_x - label.get_width() // 2,
+                              self.y_0 + 10))
 
-    def draw_y_labels(self) -> None:
+    def draw_y_labels(self, surface: pg.Surface) -> None:
         """Draws labels for the y-axis, excluding the zero."""
         label_step = max(1, round(40 / self.y_unit))
-        font = pg.font.Font(None, 24)
         for y in range(-self.n_y, self.n_y + 1):
             if y % label_step == 0 and y != 0:  # Skip zero
                 pixel_y = self.y_0 - y * self.y_unit
-                label = font.render(str(y), True, BLACK)
-                screen.blit(label,
-                            (self.x_0 - 30, pixel_y - label.get_height() // 2))
+                label = render_label(str(y))
+                surface.blit(label,
+                             (self.x_0 - 30,
+                              pixel_y - label.get_height() // 2))
 
-    def draw_centered_zero(self) -> None:
+    def draw_centered_zero(self, surface: pg.Surface) -> None:
         """Draws the centered zero label at the origin."""
-        font = pg.font.Font(None, 24)
-        label = font.render("0", True, BLACK)
+        label = render_label("0")
         pixel_x = self.x_0 - self.x_unit  # (-1) * x_unit
         pixel_y = self.y_0 + self.y_unit  # (-1) * y_unit
-        screen.blit(label,
-                    (pixel_x + self.x_unit // 2 - label.get_width() // 2,
-                     pixel_y - self.y_unit // 2 - label.get_height() // 2))
+        surface.blit(label,
+                     (pixel_x + self.x_unit // 2 - label.get_width() // 2,
+                      pixel_y - self.y_unit // 2 - label.get_height() // 2))
 
-    def draw_labels(self) -> None:
+    def draw_labels(self, surface: pg.Surface) -> None:
         """Draws all axis labels, including the zero at the center."""
-        self.draw_x_labels()
-        self.draw_y_labels()
-        self.draw_centered_zero()
+        self.draw_x_labels(surface)
+        self.draw_y_labels(surface)
+        self.draw_centered_zero(surface)
+
+    @property
+    def background_key(self) -> tuple:
+        """Returns the state the background layer depends on."""
+        return (self.x_0, self.y_0, self.x_unit, self.y_unit,
+                self.extra_grid_flag)
+
+    def render_background(self) -> None:
+        """Renders the grid, notches, and labels into the off-screen
+        background surface."""
+        if self.background is None:
+            self.background = pg.Surface((self.width, self.height))
+        self.paint(self.background)
+
+    def paint(self, surface: pg.Surface) -> None:
+        """
+        Paints the background, grid, axes, notches, and labels directly,
+        limited to the clipping rectangle of the surface if it has one.
 
-    def draw(self) -> None:
-        """Redraws the entire grid, notches, and labels."""
+        :param surface: The surface to paint on.
+        """
+        surface.fill(WHITE)
         if self.extra_grid_flag:
-            self.draw_extra_grid()
+            self.draw_extra_grid(surface)
+
+        self.draw_grid(surface)
+        pg.draw.line(surface, BLACK, (0, self.y_0), (self.width, self.y_0), 1)
+        pg.draw.line(surface, BLACK, (self.x_0, 0), (self.x_0, self.height),
+                     1)
+        self.draw_notches(surface)
+        self.draw_labels(surface)
 
-        self.draw_grid()
-        pg.draw.line(screen, BLACK, (0, self.y_0), (WIDTH, self.y_0), 1)
-        pg.draw.line(screen, BLACK, (self.x_0, 0), (self.x_0, HEIGHT), 1)
-        self.draw_notches()
-        self.draw_labels()
+    def draw(self, surface: pg.Surface) -> None:
+        """
+        Blits the grid, notches, and labels, re-rendering the cached
+        background only when the origin, units or grid mode have changed.
+
+        :param surface: The surface to draw on.
+        """
+        key = self.background_key
+        if key != self.rendered_key:
+            self.render_background()
+            self.rendered_key = key
+        surface.blit(self.background, (0, 0))
 
 
-class Graph:
-    """Represents a graph of a function with specified borders, color, and
-    axis units."""
+class Scene:
+    """Long-lived collection of graphs loaded once from the definitions,
+    re-sampled only when the view leaves their samples."""
 
-    def __init__(self, zero: tuple[int, int], units: tuple[int, int],
-                 functn: str, color: tuple[int, int, int],
-                 borders: tuple[float, float]) -> None:
+    def __init__(self, graphs: list[Graph], sampler=None,
+                 background: bool = False, on_ready=None,
+                 tiles=None, cache=None) -> None:
         """
-        Initializes the graph with the provided parameters.
+        Initializes the scene with graph objects.
+
+        :param graphs: Graph and ParametricGraph objects to display.
+        :param sampler: Optional ParallelSampler used to re-sample several
+                        graphs at once in worker processes.
+        :param background: Whether to sample on a background thread.
+        :param on_ready: Called from the background thread when new
+                         samples are ready to be collected.
+        :param tiles: Optional TileCache the curves are drawn from instead
+                      of the scene's own samples.
+        :param cache: Optional SampleCache samples are loaded from and
+                      saved to.
+        """
+        self.graphs = graphs
+        self.sampler = sampler
+        self.tiles = tiles
+        self.cache = cache
+        self.projection = None
+        # Incremented whenever the samples change, so that a caller can
+        # tell a re-projection apart from new curve content
+        self.revision = 0
+        self.values = {}
+
+        self.terms = TermCache()
+        self.share_terms()
+
+        self.index = None
+        self.unknown_bounds = set()
+        # The graphs overlapping the view as of the last projection
+        self.visible = []
+
+        self.worker = ThreadPoolExecutor(max_workers=1) if background \
+            else None
+        self.on_ready = on_ready
+        self.generation = 0
+        self.pending = None
+        self.pending_graphs = None
+        self.pending_window = None
+        self.pending_units = None
+
+    def update(self, definitions: list[tuple]) -> tuple[int, int]:
+        """
+        Replaces the graphs with ones for the new definitions, reusing the
+        existing graph objects, and so their samples, for every definition
+        that has not changed.
 
-        :param zero: (x_0, y_0) center of the coordinate system.
-        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
-        :param functn: The mathematical function as a string,
-        e.g., "math.sin(x)".
-        :param color: RGB tuple or predefined color name.
-        :param borders: (A, B) range of x-values for the graph.
+        :param definitions: Graph definitions as returned by get_input.
+        :return: The number of (added, removed) graphs.
         """
-        self.A = borders[0]
-        self.B = borders[1]
-        n = int((self.B - self.A) // dx)
-        original_x_values = [round(self.A + k * dx, 1)
-                             for k in range(0, n + 2)]
+        existing = {}
+        for graph in self.graphs:
+            existing.setdefault(graph.definition, []).append(graph)
+
+        graphs = []
+        added = 0
+        for definition in definitions:
+            unchanged = existing.get(definition)
+            if unchanged:
+                graphs.append(unchanged.pop())
+            else:
+                graphs.append(create_graph(definition))
+                added += 1
+        removed = len(self.graphs) - (len(graphs) - added)
+
+        self.graphs = graphs
+        self.share_terms()
+        self.index = None
+        self.projection = None
+        self.revision += 1
+        if self.tiles is not None:
+            self.tiles.clear()
+        return added, removed
+
+    def share_terms(self) -> int:
+        """
+        Plans the evaluation of the expressions of every graph, so that
+        the subexpressions they share are evaluated through the cache.
+
+        :return: The number of shared subexpressions.
+        """
+        return share_terms([expression for graph in self.graphs
+                            for expression in graph.expressions], self.terms)
 
-        self.x_0 = zero[0]
-        self.y_0 = zero[1]
+    def set_values(self, values: dict[str, float]) -> None:
+        """
+        Sets the values of the free parameters for the next frames.
 
-        self.x_unit = units[0]
-        self.y_unit = units[1]
+        :param values: Parameter values by name.
+        """
+        self.values = dict(values)
 
-        self.functn = functn
-        self.color = color
+    def apply_values(self) -> bool:
+        """
+        Passes the parameter values on to the graphs, unless a background
+        request is still sampling the graphs with the previous ones.
 
-        self.x_values = [x * self.x_unit + self.x_0 for x in original_x_values]
-        self.y_values = [
-            self.y_0 - (eval(self.functn)) * self.y_unit
-            for x in original_x_values
-        ]
+        :return: True if any graph has to be sampled again.
+        """
+        if self.pending is not None:
+            return False
+        changed = False
+        for graph in self.graphs:
+            changed |= graph.set_parameters(self.values)
+        if changed:
+            self.index = None
+            if self.tiles is not None:
+                self.tiles.clear()
+        return changed
+
+    def query(self, window: tuple[float, float, float, float]
+              ) -> list[Graph]:
+        """
+        Finds the graphs whose bounds overlap a window, building the index
+        first if the graphs or their bounds have changed.
 
-    def draw(self) -> None:
-        """Draws the graph based on the calculated x and y values."""
-        for i in range(1, len(self.x_values)):
-            pg.draw.line(screen, self.color,
-                         (self.x_values[i - 1], self.y_values[i - 1]),
-                         (self.x_values[i], self.y_values[i]), 1)
+        :param window: (x_min, x_max, y_min, y_max) world window.
+        :return: The graphs in their drawing order.
+        """
+        if self.index is None:
+            self.index = GridIndex([UNBOUNDED if graph.bounds is None
+                                    else graph.bounds
+                                    for graph in self.graphs])
+            self.unknown_bounds = {id(graph) for graph in self.graphs
+                                   if graph.bounds is None}
+        return [self.graphs[index]
+                for index in self.index.query(window).tolist()]
+
+    def reindex(self, graphs: list[Graph]) -> None:
+        """
+        Drops the index if any of the graphs has found its bounds since
+        the index was built, e.g., a parametric graph sampled for the
+        first time.
 
+        :param graphs: The graphs that have just been sampled.
+        """
+        if any(graph.bounds is not None and id(graph) in self.unknown_bounds
+               for graph in graphs):
+            self.index = None
 
-class ParametricGraph(Graph):
-    """Represents a graph of a parametric equation defined by x(t) and y(t)."""
+    def calculate(self, generation: int, graphs: list[Graph],
+                  window: tuple[float, float, float, float],
+                  units: tuple[int, int]) -> list:
+        """
+        Calculates new samples for the graphs, or loads them from the
+        sample cache, giving up as soon as a newer request has been made.
+        A graph whose evaluation fails is left empty.
 
-    def __init__(self, zero: tuple[int, int], units: tuple[int, int],
-                 x_func: str, y_func: str, color: tuple[int, int, int],
-                 t_range: tuple[float, float], dt: float) -> None:
+        :param generation: The request this calculation belongs to.
+        :param graphs: The graphs to sample.
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: Samples for every graph, as (x, y) world arrays or an
+                 (N, 2) array from the cache, or None if stale.
+        """
+        # Workers and the cache return samples only, so the coarse pass
+        # that gives a parametric curve its bounds is run here
+        for graph in graphs:
+            graph.calculate_bounds()
+
+        # Graphs with parameters are not cached, as a sweep gives them new
+        # values on every frame
+        samples = [None] * len(graphs)
+        if self.cache is not None:
+            samples = [None if graph.parameters
+                       else self.cache.load(graph.curve_key, window, units)
+                       for graph in graphs]
+        missing = [index for index, graph_samples in enumerate(samples)
+                   if graph_samples is None]
+
+        # Data series are decimated from their pyramid in this process; a
+        # worker would have to open the file and build the pyramid again
+        pooled = []
+        if self.sampler is not None:
+            pooled = [index for index in missing
+                      if not isinstance(graphs[index], DataGraph)]
+        calculated = {}
+        if len(pooled) > 1:
+            calculated = dict(zip(pooled, self.sampler.calculate(
+                [graphs[index] for index in pooled], window, units)))
+
+        for index in missing:
+            if index in calculated:
+                graph_samples = calculated[index]
+            elif generation != self.generation:
+                return None
+            else:
+                graph_samples = graphs[index].try_calculate_coordinates(
+                    window, units)
+            if graph_samples is None:
+                # The error has been printed; the graph stays empty
+                samples[index] = np.empty(0), np.empty(0)
+                continue
+            samples[index] = graph_samples
+            if self.cache is not None and not graphs[index].parameters:
+                self.cache.save(graphs[index].curve_key, window, units,
+                                graph_samples)
+        if generation != self.generation:
+            return None
+        return samples
+
+    def notify(self, future) -> None:
+        """Calls on_ready once a background request has new samples or
+        has failed, so that collect() is called either way."""
+        if (self.on_ready is not None and not future.cancelled()
+                and (future.exception() is not None
+                     or future.result() is not None)):
+            self.on_ready()
+
+    def request(self, graphs: list[Graph],
+                window: tuple[float, float, float, float],
+                units: tuple[int, int],
+                viewport: tuple[float, float, float, float]) -> None:
         """
-        Initializes the parametric graph with the given parameters.
+        Starts sampling the graphs on the background thread unless the
+        pending request already covers the view; a pending request that
+        does not is cancelled.
 
-        :param zero: (x_0, y_0) center of the coordinate system.
+        :param graphs: The graphs to sample.
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
         :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
-        :param x_func: String defining x(t), e.g., "5 * math.cos(t)".
-        :param y_func: String defining y(t), e.g., "3 * math.sin(t)".
-        :param color: RGB tuple or predefined color name.
-        :param t_range: (t0, tN) range for the parameter t.
-        :param dt: Step size for t.
-        """
-        self.x_func = x_func
-        self.y_func = y_func
-        self.color = color
-        self.t0, self.tN = t_range
-        self.dt = dt
-        self.x_0, self.y_0 = zero
-        self.x_unit, self.y_unit = units
-
-        self.x_values = []
-        self.y_values = []
-
-        self.calculate_coordinates()
-
-    def calculate_coordinates(self) -> None:
-        """Calculates the x and y coordinates
-        based on the parametric functions."""
-        t_values = np.linspace(self.t0, self.tN, int(
-            (self.tN - self.t0) / self.dt) + 1)
-        self.x_values = [eval(self.x_func) * self.x_unit + self.x_0
-                         for t in t_values]
-        self.y_values = [self.y_0 - eval(self.y_func) * self.y_unit
-                         for t in t_values]
-
-    def draw(self) -> None:
-        """Draws the parametric graph based on the calculated coordinates."""
-        for i in range(1, len(self.x_values)):
-            pg.draw.line(screen, self.color,
-                         (self.x_values[i - 1], self.y_values[i - 1]),
-                         (self.x_values[i], self.y_values[i]), 1)
+        :param viewport: The visible world window.
+        """
+        if self.pending is not None and units == self.pending_units:
+            x_min, x_max, y_min, y_max = self.pending_window
+            if (x_min <= viewport[0] and viewport[1] <= x_max
+                    and y_min <= viewport[2] and viewport[3] <= y_max):
+                return
+        if self.pending is not None:
+            self.pending.cancel()
+        self.generation += 1
+        self.pending_graphs = graphs
+        self.pending_window = window
+        self.pending_units = units
+        self.pending = self.worker.submit(self.calculate, self.generation,
+                                          graphs, window, units)
+        self.pending.add_done_callback(self.notify)
+
+    def collect(self) -> bool:
+        """
+        Stores the samples of a finished background request. If the
+        request has failed, the error is printed and its graphs are left
+        empty for the requested window, so that the request is not
+        repeated on every frame.
+
+        :return: True if new samples were stored.
+        """
+        if self.pending is None or not self.pending.done():
+            return False
+        future, self.pending = self.pending, None
+        if future.cancelled():
+            return False
+        if future.exception() is not None:
+            print(f"Error sampling graphs: {future.exception()}")
+            samples = [(np.empty(0), np.empty(0))] * len(self.pending_graphs)
+        else:
+            samples = future.result()
+        if samples is None:
+            return False
+        for graph, graph_samples in zip(self.pending_graphs, samples):
+            graph.sample(self.pending_window, self.pending_units,
+                         graph_samples)
+        self.reindex(self.pending_graphs)
+        return True
+
+    def project(self, axes: CoordinateSystem) -> None:
+        """
+        Re-samples graphs near the view whose samples no longer cover it
+        and re-projects the graphs overlapping the view if anything has
+        changed since the last call.
+
+        :param axes: The CoordinateSystem object representing the current
+                     grid and axes.
+        """
+        if self.tiles is not None:
+            if self.apply_values():
+                self.revision += 1
+            return
+        collected = self.collect()
+        swept = self.apply_values()
+        # Samples for one set of parameter values are not worth a margin
+        window = expand_viewport(axes.viewport,
+                                 sweep_margin if swept else sample_margin)
+        stale = [graph for graph in self.query(window)
+                 if not graph.covers(axes.viewport, axes.units)]
+        if self.worker is not None and stale:
+            self.request(stale, window, axes.units, axes.viewport)
+            stale = []
+        elif stale:
+            samples = self.calculate(self.generation, stale, window,
+                                     axes.units)
+            for graph, graph_samples in zip(stale, samples):
+                graph.sample(window, axes.units, graph_samples)
+            self.reindex(stale)
+
+        if stale or collected:
+            self.revision += 1
+        projection = (axes.zero, axes.units)
+        if projection == self.projection and not stale and not collected:
+            return
+        self.visible = self.query(axes.viewport)
+        for graph in self.visible:
+            graph.project(axes.zero, axes.units)
+        self.projection = projection
+
+    def draw(self, axes: CoordinateSystem,
+             surface: pg.Surface, rect: pg.Rect = None) -> None:
+        """
+        Projects and draws the graphs overlapping the view for the given
+        coordinate system.
+
+        :param axes: The CoordinateSystem object representing the current
+                     grid and axes.
+        :param surface: The surface to draw on.
+        :param rect: Optional pixel rectangle; only the curve segments
+                     crossing it are drawn.
+        """
+        if self.tiles is not None:
+            self.tiles.draw(axes, self.graphs, surface, rect)
+            return
+        self.project(axes)
+        for graph in self.visible:
+            draw_graph(surface, graph, rect)
+
+    def close(self) -> None:
+        """Stops the background thread and the worker processes."""
+        if self.worker is not None:
+            self.generation += 1
+            self.worker.shutdown(cancel_futures=True)
+        if self.sampler is not None:
+            self.sampler.close()
+        if self.tiles is not None:
+            self.tiles.close()
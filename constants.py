@@ -1,5 +1,3 @@
-import pygame as pg
-
 WIDTH = 1200
 HEIGHT = 800
 BLACK = (0, 0, 0)
@@ -14,11 +12,58 @@ FORESTGREEN = (34, 139, 34)
 PURPLE = (128, 0, 128)
 GREY = (244, 240, 236)
 
-dx = 0.1
+# Sampling: samples per pixel of x (or of arc length for parametric
+# graphs), extra window around the view in screen sizes, and the number
+# of dt steps per parametric chunk used for visibility culling
+samples_per_pixel = 1
+sample_margin = 1.0
+chunk_size = 16
+
+# Adaptive sampling: initial spacing in pixels, maximum chord deviation
+# in pixels, maximum number of bisections, and the chord length in pixels
+# that is cut as a discontinuity once the maximum depth is reached
+adaptive_sampling = True
+adaptive_step = 8
+adaptive_tolerance = 0.5
+adaptive_depth = 10
+discontinuity_jump = 20
+
+# Implicit graphs: initial grid cell size in pixels, and the number of
+# times the cells the curve passes through are halved
+implicit_step = 8
+implicit_depth = 3
 
 h1 = 2
 h2 = 4
 h3 = 6
 
-clock = pg.time.Clock()
-screen = pg.display.set_mode((WIDTH, HEIGHT))
+# Interactive loop: maximum redraws per second and the panning speed in
+# pixels per second while an arrow key is held
+frame_rate = 60
+pan_speed = 600
+
+# Tile cache: tile size in pixels, memory budget in bytes, and the extra
+# world window sampled around a tile in tile sizes
+tile_size = 256
+tile_budget = 64 * 2 ** 20
+tile_margin = 0.25
+
+# Parameter sweeps: seconds to sweep a parameter's range and back, steps
+# across the range per nudge key press, and the extra window sampled
+# around the view in screen sizes while parameters change every frame
+sweep_period = 4.0
+sweep_steps = 100
+sweep_margin = 0.1
+
+# Subexpressions shared between curves: memory budget in bytes of the
+# cached results
+term_cache_budget = 32 * 2 ** 20
+
+# Spatial index: maximum grid cells along each axis, and the most cells a
+# curve's bounding box is listed under before it is tested on every query
+index_grid = 256
+index_cells = 16
+
+# On-disk sample cache: default directory and size budget in bytes
+sample_cache_dir = ".sample_cache"
+sample_cache_budget = 256 * 2 ** 20
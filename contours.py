@@ -0,0 +1,245 @@
+import math
+from typing import Callable, Tuple
+
+import numpy as np
+
+Field = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+def crossing(v00: np.ndarray, v10: np.ndarray, v01: np.ndarray,
+             v11: np.ndarray) -> np.ndarray:
+    """
+    Finds the cells the zero set passes through, i.e., cells with finite
+    corner values of both signs.
+
+    :param v00: Values at the lower left corners.
+    :param v10: Values at the lower right corners.
+    :param v01: Values at the upper left corners.
+    :param v11: Values at the upper right corners.
+    :return: Boolean mask of the crossed cells.
+    """
+    corners = np.stack((v00, v10, v01, v11))
+    inside = (corners < 0).sum(axis=0)
+    return np.isfinite(corners).all(axis=0) & (inside > 0) & (inside < 4)
+
+
+def subdivide(function: Field, origin: tuple[float, float],
+              size: tuple[float, float], cells: tuple
+              ) -> tuple[tuple, tuple[float, float]]:
+    """
+    Splits every cell into four, evaluating the five new points of all
+    cells in a single call, and keeps the children that are crossed.
+
+    :param function: Maps (x, y) world arrays to the field values.
+    :param origin: World (x, y) of the lower left corner of the grid.
+    :param size: World (width, height) of a cell.
+    :param cells: (i, j, v00, v10, v01, v11) arrays of the cell columns,
+                  rows and corner values.
+    :return: The crossed children in the same form, and their size.
+    """
+    i, j, v00, v10, v01, v11 = cells
+    width, height = size[0] / 2, size[1] / 2
+    x_0 = origin[0] + 2 * i * width
+    y_0 = origin[1] + 2 * j * height
+    x_m, y_m = x_0 + width, y_0 + height
+    x_1, y_1 = x_m + width, y_m + height
+
+    with np.errstate(all="ignore"):
+        values = function(np.concatenate((x_m, x_1, x_m, x_0, x_m)),
+                          np.concatenate((y_0, y_m, y_1, y_m, y_m)))
+    bottom, right, top, left, center = np.split(values, 5)
+
+    children = (
+        (2 * i, 2 * j, v00, bottom, left, center),
+        (2 * i + 1, 2 * j, bottom, v10, center, right),
+        (2 * i, 2 * j + 1, left, center, v01, top),
+        (2 * i + 1, 2 * j + 1, center, right, top, v11),
+    )
+    cells = tuple(np.concatenate(parts) for parts in zip(*children))
+    keep = crossing(*cells[2:])
+    return tuple(part[keep] for part in cells), (width, height)
+
+
+def march(origin: tuple[float, float], size: tuple[float, float],
+          columns: int, cells: tuple
+          ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs marching squares over crossed cells of one size, interpolating
+    where the zero set crosses each edge. Saddle cells are resolved by
+    the mean of their corners.
+
+    Edges are numbered counter-clockwise from the bottom, every edge
+    crossing is given an id that is shared by the two cells next to the
+    edge, and segments are oriented with the negative side on their left,
+    so that a segment ending at a crossing is continued by the segment of
+    the next cell that starts there.
+
+    :param origin: World (x, y) of the lower left corner of the grid.
+    :param size: World (width, height) of a cell.
+    :param columns: Number of cells per grid row.
+    :param cells: (i, j, v00, v10, v01, v11) arrays of the cell columns,
+                  rows and corner values.
+    :return: (start, end) ids, world x and world y of the segments as
+             (2, M) arrays, and the index of the cell of every segment.
+    """
+    i, j, v00, v10, v01, v11 = cells
+    width, height = size
+    x_0 = origin[0] + i * width
+    y_0 = origin[1] + j * height
+
+    with np.errstate(all="ignore"):
+        bottom = v00 / (v00 - v10)
+        right = v10 / (v10 - v11)
+        top = v01 / (v01 - v11)
+        left = v00 / (v00 - v01)
+    x = np.stack((x_0 + bottom * width, x_0 + width,
+                  x_0 + top * width, x_0))
+    y = np.stack((y_0, y_0 + right * height,
+                  y_0 + height, y_0 + left * height))
+
+    # Horizontal edges first, then vertical ones, row by row
+    vertical = (j.max(initial=0) + 2) * columns
+    ids = np.stack((j * columns + i, vertical + j * (columns + 1) + i + 1,
+                    (j + 1) * columns + i, vertical + j * (columns + 1) + i))
+
+    # Corners in counter-clockwise order, edge k running from corner k to
+    # corner k + 1; the contour enters a cell where that goes from the
+    # positive to the negative side
+    inside = np.stack((v00 < 0, v10 < 0, v11 < 0, v01 < 0))
+    following = np.roll(inside, -1, axis=0)
+    crossed = inside != following
+    entering = following & ~inside
+
+    count = crossed.sum(axis=0)
+    single = np.flatnonzero(count == 2)
+    first = crossed[:, single].argmax(axis=0)
+    second = 3 - crossed[::-1, single].argmax(axis=0)
+
+    # Saddles cut off the lower right and upper left corners if the lower
+    # left corner has the sign of the center, the other two otherwise
+    saddle = np.flatnonzero(count == 4)
+    center = (v00 + v10 + v01 + v11)[saddle] < 0
+    pair = np.where(inside[0, saddle] == center, 1, 3)
+    cell = np.concatenate((single, saddle, saddle))
+    ends = np.stack((np.concatenate((first, np.zeros_like(saddle),
+                                     4 - pair)),
+                     np.concatenate((second, pair,
+                                     np.full_like(saddle, 2)))))
+    ends = np.where(entering[ends[0], cell], ends, ends[::-1])
+    return ids[ends, cell], x[ends, cell], y[ends, cell], cell
+
+
+def rank(following: np.ndarray) -> tuple[np.ndarray, np.ndarray,
+                                         np.ndarray]:
+    """
+    Ranks linked segments by pointer jumping, following every link in
+    each of log2(M) vectorized passes instead of walking the chains.
+
+    :param following: Index of the segment after each segment, or -1.
+    :return: The last segment reached from each segment, the number of
+             links to it, and the lowest index on the way, which for a
+             segment on a closed loop is the lowest index on the loop.
+    """
+    count = len(following)
+    indices = np.arange(count)
+    last = np.where(following < 0, indices, following)
+    distance = (following >= 0).astype(np.intp)
+    lowest = np.minimum(indices, last)
+    for _ in range(max(count - 1, 1).bit_length()):
+        distance += distance[last]
+        lowest = np.minimum(lowest, lowest[last])
+        last = last[last]
+    return last, distance, lowest
+
+
+def chain(ids: np.ndarray, x: np.ndarray,
+          y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Joins oriented segments into polylines, so that a contour is drawn
+    with one call per connected piece. Closed loops are opened before
+    their lowest segment and end where they start.
+
+    :param ids: (2, M) start and end ids of the segments.
+    :param x: (2, M) world x of the segment starts and ends.
+    :param y: (2, M) world y of the segment starts and ends.
+    :return: (x, y) world arrays, NaN between polylines.
+    """
+    count = ids.shape[1]
+    order = np.argsort(ids[0])
+    position = np.minimum(np.searchsorted(ids[0], ids[1], sorter=order),
+                          count - 1)
+    following = np.where(ids[0, order[position]] == ids[1],
+                         order[position], -1)
+
+    last, _, lowest = rank(following)
+    loop = following[last] >= 0
+    following[loop & (following == lowest)] = -1
+    last, distance, _ = rank(following)
+
+    order = np.lexsort((-distance, last))
+    ends = np.flatnonzero(np.diff(last[order])) + 1
+    tails = order[np.append(ends, count) - 1]
+    positions = np.repeat(np.append(ends, count), 2)
+    x_path = np.insert(x[0, order], positions,
+                       np.column_stack((x[1, tails],
+                                        np.full(len(tails), np.nan))).ravel())
+    y_path = np.insert(y[0, order], positions,
+                       np.column_stack((y[1, tails],
+                                        np.full(len(tails), np.nan))).ravel())
+    return x_path[:-1], y_path[:-1]
+
+
+def trace_contour(function: Field,
+                  window: tuple[float, float, float, float],
+                  units: tuple[float, float], step: float,
+                  depth: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Traces the zero set of f(x, y) over a window.
+
+    The field is evaluated over a grid of cells of about `step` pixels in
+    a single call, and only the cells the zero set passes through are
+    subdivided, `depth` times, so that the cost grows with the length of
+    the contour rather than with the area of the window. Features smaller
+    than a grid cell can be missed. Segments whose midpoint is further
+    from zero than the corners of their cell are dropped, so that poles
+    of f are not drawn as part of the contour.
+
+    :param function: Maps (x, y) world arrays to the field values.
+    :param window: (x_min, x_max, y_min, y_max) world window to trace.
+    :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+    :param step: Size of the initial grid cells in pixels.
+    :param depth: Number of times the crossed cells are halved.
+    :return: (x, y) world arrays, NaN between polylines.
+    """
+    x_min, x_max, y_min, y_max = window
+    columns = max(math.ceil((x_max - x_min) * units[0] / step), 1)
+    rows = max(math.ceil((y_max - y_min) * units[1] / step), 1)
+    origin = x_min, y_min
+    size = (x_max - x_min) / columns, (y_max - y_min) / rows
+
+    x_grid, y_grid = np.meshgrid(np.linspace(x_min, x_max, columns + 1),
+                                 np.linspace(y_min, y_max, rows + 1))
+    with np.errstate(all="ignore"):
+        values = function(x_grid.ravel(), y_grid.ravel())
+    values = values.reshape(rows + 1, columns + 1)
+    corners = (values[:-1, :-1], values[:-1, 1:],
+               values[1:, :-1], values[1:, 1:])
+    j, i = np.nonzero(crossing(*corners))
+    cells = (i, j) + tuple(corner[j, i] for corner in corners)
+
+    for _ in range(depth):
+        if not len(cells[0]):
+            break
+        cells, size = subdivide(function, origin, size, cells)
+        columns *= 2
+    if not len(cells[0]):
+        return np.empty(0), np.empty(0)
+
+    ids, x, y, cell = march(origin, size, columns, cells)
+    with np.errstate(all="ignore"):
+        middle = np.abs(function((x[0] + x[1]) / 2, (y[0] + y[1]) / 2))
+    limit = np.abs(np.stack(cells[2:])).max(axis=0)[cell]
+    keep = middle <= limit
+    if not keep.any():
+        return np.empty(0), np.empty(0)
+    return chain(ids[:, keep], x[:, keep], y[:, keep])
@@ -0,0 +1,159 @@
+import csv
+import hashlib
+import math  # noqa: F401 - available to the t_range and parameter ranges
+import os
+import re
+import sys
+import time
+from ast import literal_eval
+from typing import List, Tuple, Union
+
+# A trailing "name=(low, high)" field declaring a free parameter
+PARAMETER = re.compile(r"\s*([A-Za-z_]\w*)\s*=\s*(\(.*\))\s*$")
+
+
+def split_parameters(row: List[str]) -> Tuple[List[str], tuple]:
+    """
+    Splits the trailing parameter fields off a row.
+
+    :param row: The fields of a definitions row.
+    :return: The remaining fields and the (name, low, high) of every
+             parameter, in the order declared.
+    """
+    parameters = []
+    while row:
+        match = PARAMETER.match(row[-1])
+        if match is None:
+            break
+        name, bounds = match.groups()
+        low, high = sorted(eval(bounds))
+        parameters.insert(0, (name, float(low), float(high)))
+        row = row[:-1]
+    return row, tuple(parameters)
+
+
+def read_definitions(path: str = "graphs.csv"
+                     ) -> List[Union[Tuple[str, str, str, str, float],
+                                     Tuple[str, str, str]]]:
+    """
+    Reads graphs from the CSV file, supporting both standard and
+    parametric graphs. Errors are raised to the caller.
+
+    :param path: Path to the graph definitions file.
+    :return: A list of tuples containing graph definitions. Each tuple includes
+             the graph type and its parameters. For parametric graphs,
+             the tuple includes ("parametric", x_func, y_func, color,
+                                 t_range, dt).
+             For standard graphs, it includes ("standard", functn,
+                                               color, borders).
+             For data series rows ("data:path; color"), it includes
+             ("data", path, color), the path being relative to the
+             definitions file.
+             For implicit rows ("implicit:f(x, y); color"), it includes
+             ("implicit", functn, color).
+             Rows other than data series may end with free parameters,
+             e.g., "a=(0.5, 3)", which are appended to the tuple as
+             ((name, low, high), ...).
+    """
+    with open(path, mode="r") as file:
+        reader = csv.reader(file, delimiter=";")
+        graphs = []
+        for row in reader:
+            if not row or row[0].startswith("#"):  # Skip blanks, comments
+                continue
+            row, parameters = split_parameters(row)
+            extra = (parameters,) if parameters else ()
+            if len(row) == 2 and row[0].startswith("data:"):  # Data series
+                if parameters:
+                    raise ValueError(f"Data series take no parameters: "
+                                     f"{row[0]}")
+                data_path = os.path.join(os.path.dirname(path),
+                                         row[0][len("data:"):].strip())
+                graphs.append(("data", data_path, row[1]))
+            elif len(row) == 2 and row[0].startswith("implicit:"):
+                functn = row[0][len("implicit:"):]
+                graphs.append(("implicit", functn, row[1]) + extra)
+            elif len(row) == 5:  # Parametric graph
+                x_func, y_func, color, t_range, dt = row
+                t_range = eval(t_range)
+                graphs.append(("parametric", x_func, y_func,
+                               color, t_range, float(dt)) + extra)
+            elif len(row) == 3:  # Standard graph
+                func, color, x_range = row
+                x_range = literal_eval(row[2])
+                graphs.append(("standard", func, color, x_range) + extra)
+        return graphs
+
+
+def get_input(path: str = "graphs.csv"
+              ) -> List[Union[Tuple[str, str, str, str, float],
+                              Tuple[str, str, str]]]:
+    """
+    Reads graphs from the CSV file, exiting the program if it cannot be
+    read.
+
+    :param path: Path to the graph definitions file.
+    :return: A list of tuples containing graph definitions, as returned by
+             read_definitions.
+    """
+    try:
+        return read_definitions(path)
+    except Exception as e:
+        print(f"Error reading input: {e}")
+        sys.exit(1)
+
+
+class DefinitionWatcher:
+    """Polls the graph definitions file for changes.
+
+    The file is only re-read when its modification time or size changed,
+    and only reported as changed when its content hash differs."""
+
+    def __init__(self, path: str, interval: float = 0.5) -> None:
+        """
+        Records the current state of the file.
+
+        :param path: Path to the graph definitions file.
+        :param interval: Minimum number of seconds between two polls.
+        """
+        self.path = path
+        self.interval = interval
+        self.last_poll = time.monotonic()
+        self.stat = self.read_stat()
+        self.digest = self.read_digest()
+
+    def read_stat(self) -> Tuple[int, int]:
+        """Returns the (mtime_ns, size) of the file, or None if missing."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def read_digest(self) -> str:
+        """Returns the SHA-1 of the file content, or None if unreadable."""
+        try:
+            with open(self.path, mode="rb") as file:
+                return hashlib.sha1(file.read()).hexdigest()
+        except OSError:
+            return None
+
+    def changed(self) -> bool:
+        """
+        Checks whether the file content changed since the last change.
+
+        :return: True if the file should be reloaded.
+        """
+        now = time.monotonic()
+        if now - self.last_poll < self.interval:
+            return False
+        self.last_poll = now
+        stat = self.read_stat()
+        if stat == self.stat:
+            return False
+        self.stat = stat
+        digest = self.read_digest()
+        if digest is None or digest == self.digest:
+            return False
+        self.digest = digest
+        return True
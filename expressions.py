@@ -0,0 +1,391 @@
+import ast
+import math
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from constants import term_cache_budget
+
+# math.* functions that have a drop-in numpy ufunc equivalent.
+NUMPY_EQUIVALENTS = {
+    "sin": "sin", "cos": "cos", "tan": "tan",
+    "asin": "arcsin", "acos": "arccos", "atan": "arctan",
+    "atan2": "arctan2",
+    "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "asinh": "arcsinh", "acosh": "arccosh", "atanh": "arctanh",
+    "exp": "exp", "expm1": "expm1",
+    "log10": "log10", "log2": "log2", "log1p": "log1p",
+    "sqrt": "sqrt", "fabs": "fabs", "pow": "power",
+    "floor": "floor", "ceil": "ceil", "trunc": "trunc",
+    "hypot": "hypot", "copysign": "copysign",
+    "degrees": "degrees", "radians": "radians",
+}
+
+
+class _MathToNumpy(ast.NodeTransformer):
+    """Rewrites math.<func>(...) calls into their numpy equivalents and
+    records whether every call could be translated."""
+
+    def __init__(self) -> None:
+        self.vectorizable = True
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        func = node.func
+        if (isinstance(func, ast.Attribute)
+                and isinstance(func.value, ast.Name)
+                and func.value.id == "math"):
+            # math.log(x, base) has no single-ufunc equivalent
+            if func.attr == "log" and len(node.args) == 1:
+                name = "log"
+            else:
+                name = NUMPY_EQUIVALENTS.get(func.attr)
+            if name is None or node.keywords:
+                self.vectorizable = False
+                return node
+            node.func = ast.copy_location(
+                ast.Attribute(value=ast.Name(id="np", ctx=ast.Load()),
+                              attr=name, ctx=ast.Load()), func)
+        return node
+
+
+# Operations that can be evaluated on their own and shared between curves
+SHAREABLE = (ast.BinOp, ast.UnaryOp, ast.Call)
+# Nodes with names of their own, which cannot be evaluated out of context
+SCOPED = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp,
+          ast.GeneratorExp)
+
+
+def find_terms(tree: ast.AST, variables: tuple[str, ...]
+               ) -> dict[int, tuple[str, tuple[str, ...]]]:
+    """
+    Finds the subexpressions that could be shared with other expressions,
+    i.e., the operations and calls that depend on a free variable. Every
+    node is described once, from its children's descriptions, so that
+    long sums of terms are not walked over and over.
+
+    :param tree: The vectorized expression tree.
+    :param variables: Names of the free variables.
+    :return: The id() of every such node mapped to its key, which is the
+             same for equal subexpressions, and the other names it reads,
+             e.g., parameters.
+    """
+    found = {}
+
+    def describe(node) -> tuple[str, set[str], bool]:
+        # Returns the key, the names read, and whether there is a scope
+        if isinstance(node, SCOPED):
+            return ast.dump(node), set(), True
+        if isinstance(node, ast.Name):
+            return node.id, {node.id}, False
+        if isinstance(node, ast.Constant):
+            return repr(node.value), set(), False
+        if not isinstance(node, ast.AST):
+            return repr(node), set(), False
+        if not node._fields:  # Operators and contexts
+            return type(node).__name__, set(), False
+        parts = []
+        names = set()
+        scoped = False
+        for field in node._fields:
+            value = getattr(node, field, None)
+            items = value if isinstance(value, list) else [value]
+            keys = []
+            for item in items:
+                key, inner, inner_scoped = describe(item)
+                keys.append(key)
+                names |= inner
+                scoped |= inner_scoped
+            parts.append(f"[{','.join(keys)}]" if isinstance(value, list)
+                         else keys[0])
+        key = f"{type(node).__name__}({','.join(parts)})"
+        if (isinstance(node, SHAREABLE) and not scoped
+                and names & set(variables)):
+            found[id(node)] = key, tuple(sorted(
+                names - set(variables) - {"math", "np"}))
+        return key, names, scoped
+
+    describe(tree)
+    return found
+
+
+def lift_terms(tree: ast.AST, found: dict, shared: set[str],
+               lifted: dict) -> list[tuple]:
+    """
+    Replaces the outermost shared subexpressions of a tree with names, in
+    place, so that they can be evaluated on their own.
+
+    :param tree: The vectorized expression tree.
+    :param found: The nodes of the tree as returned by find_terms.
+    :param shared: Keys of the shared subexpressions.
+    :param lifted: Filled with the name and node of every lifted key.
+    :return: (parent, field, index, node) of every replacement, for
+             restore_terms; index is None for a single node field.
+    """
+    replaced = []
+    stack = [tree]
+    while stack:
+        parent = stack.pop()
+        if isinstance(parent, SCOPED):
+            continue
+        for field, value in ast.iter_fields(parent):
+            items = value if isinstance(value, list) else [value]
+            for index, node in enumerate(items):
+                if not isinstance(node, ast.AST):
+                    continue
+                key = found.get(id(node), (None,))[0]
+                if key not in shared:
+                    stack.append(node)
+                    continue
+                if key not in lifted:
+                    lifted[key] = f"_term{len(lifted)}", node
+                name = ast.copy_location(
+                    ast.Name(id=lifted[key][0], ctx=ast.Load()), node)
+                if isinstance(value, list):
+                    value[index] = name
+                    replaced.append((parent, field, index, node))
+                else:
+                    setattr(parent, field, name)
+                    replaced.append((parent, field, None, node))
+    return replaced
+
+
+def restore_terms(replaced: list[tuple]) -> None:
+    """Puts the subexpressions replaced by lift_terms back in place."""
+    for parent, field, index, node in replaced:
+        if index is None:
+            setattr(parent, field, node)
+        else:
+            getattr(parent, field)[index] = node
+
+
+class TermCache:
+    """Keeps the results of subexpressions shared between expressions, so
+    that a term used by several curves, e.g., math.cos(t) over the same t
+    values, is evaluated once.
+
+    Results are keyed by the term, the values of the parameters it reads
+    and the contents of the sample arrays, and the least recently used
+    ones are dropped once the cache exceeds its memory budget. The cache
+    can be used from several threads at once."""
+
+    def __init__(self, budget: int = term_cache_budget) -> None:
+        """
+        Initializes an empty cache.
+
+        :param budget: Maximum memory used by the results in bytes.
+        """
+        self.budget = budget
+        self.results = OrderedDict()
+        self.memory = 0
+        self.lock = threading.Lock()
+
+    def evaluate(self, key: tuple, code, namespace: dict,
+                 local: dict) -> np.ndarray:
+        """
+        Returns the cached result of a term, evaluating it on a miss.
+
+        :param key: (term, sample arrays, parameter values) key.
+        :param code: The compiled term.
+        :param namespace: Globals to evaluate the term with.
+        :param local: Variables and parameters to evaluate the term with.
+        :return: The result of the term.
+        """
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+                return result
+        result = eval(code, namespace, local)
+        with self.lock:
+            if key not in self.results:
+                self.results[key] = result
+                self.memory += getattr(result, "nbytes", 0)
+            while len(self.results) > 1 and self.memory > self.budget:
+                _, dropped = self.results.popitem(last=False)
+                self.memory -= getattr(dropped, "nbytes", 0)
+        return result
+
+    def clear(self) -> None:
+        """Drops every result."""
+        with self.lock:
+            self.results.clear()
+            self.memory = 0
+
+
+class CompiledExpression:
+    """An expression string parsed once and evaluated over whole arrays of
+    sample values, falling back to per-sample eval() when the expression
+    cannot be vectorized."""
+
+    def __init__(self, source: str, *variables: str) -> None:
+        """
+        Parses and compiles the expression.
+
+        :param source: The expression string, e.g., "3 * math.sin(t)".
+        :param variables: Names of the free variables, e.g., "x" or "t",
+                          or "x" and "y" for implicit graphs.
+        """
+        self.source = source.strip()
+        self.variables = variables
+
+        tree = ast.parse(self.source, mode="eval")
+        self.scalar_code = compile(tree, "<expression>", "eval")
+
+        transformer = _MathToNumpy()
+        self.vector_tree = ast.fix_missing_locations(transformer.visit(tree))
+        self.vectorized = transformer.vectorizable
+        self.vector_code = compile(self.vector_tree, "<expression>", "eval")
+        # Found on first use, as most expressions are never shared, e.g.,
+        # in worker processes
+        self.found = None
+        self.candidates = None
+        # (vectorized code, lifted terms, TermCache), replaced as a whole
+        # so that a thread evaluating the expression sees a consistent plan
+        self.plan = (self.vector_code, [], None)
+
+        self.namespace = {"math": math, "np": np}
+
+    @property
+    def terms(self) -> dict[str, tuple[str, ...]]:
+        """Returns the keys of the subexpressions that could be shared,
+        mapped to the other names they read."""
+        if self.found is None:
+            self.found = find_terms(self.vector_tree, self.variables) \
+                if self.vectorized else {}
+            self.candidates = dict(self.found.values())
+        return self.candidates
+
+    def share(self, shared: set[str], cache: TermCache,
+              compiled: dict = None) -> None:
+        """
+        Lifts the subexpressions shared with other expressions out of the
+        vectorized code, so that they are evaluated through the cache.
+
+        :param shared: Keys of the shared subexpressions.
+        :param cache: The TermCache holding their results.
+        :param compiled: Optional code of the subexpressions by key, also
+                         filled in, to compile each of them only once.
+        """
+        compiled = {} if compiled is None else compiled
+        shared = shared & self.terms.keys()
+        if not shared:
+            self.plan = (self.vector_code, [], None)
+            return
+        lifted = {}
+        replaced = lift_terms(self.vector_tree, self.found, shared, lifted)
+        try:
+            code = compile(self.vector_tree, "<expression>", "eval")
+        finally:
+            restore_terms(replaced)
+        terms = []
+        for key, (name, node) in lifted.items():
+            if key not in compiled:
+                compiled[key] = compile(ast.Expression(node), "<expression>",
+                                        "eval")
+            terms.append((name, key, compiled[key], self.terms[key]))
+        self.plan = (code, terms, cache)
+
+    def __call__(self, *values: np.ndarray,
+                 parameters: dict[str, float] = None) -> np.ndarray:
+        """
+        Evaluates the expression for every sample value.
+
+        :param values: 1-D arrays of values, one per free variable and all
+                       of the same length.
+        :param parameters: Values of the named free parameters, e.g.,
+                           {"a": 2.0}, the same for every sample.
+        :return: Float array of results with the same shape as values.
+        """
+        values = [np.asarray(value, dtype=np.float64) for value in values]
+        parameters = parameters or {}
+        if self.vectorized:
+            try:
+                return self.evaluate_vector(values, parameters)
+            except Exception:
+                # Anything numpy cannot handle goes through eval() per sample
+                self.vectorized = False
+        return self.evaluate_scalar(values, parameters)
+
+    def evaluate_vector(self, values: list[np.ndarray],
+                        parameters: dict[str, float]) -> np.ndarray:
+        """Evaluates the expression in a single vectorized call, taking
+        the shared subexpressions from the cache."""
+        code, terms, cache = self.plan
+        local = {**parameters, **dict(zip(self.variables, values))}
+        with np.errstate(all="ignore"):
+            if terms:
+                grid = tuple((value.shape, hash(value.tobytes()))
+                             for value in values)
+                for name, key, term_code, names in terms:
+                    local[name] = cache.evaluate(
+                        (key, grid, tuple(parameters.get(other)
+                                          for other in names)),
+                        term_code, self.namespace, local)
+            result = eval(code, self.namespace, local)
+        result = np.array(result, dtype=np.float64)
+        shape = values[0].shape
+        if result.ndim == 0:  # Constant expression, e.g., "5"
+            return np.full(shape, result)
+        if result.shape != shape:
+            raise ValueError(f"Unexpected result shape {result.shape}")
+        return result
+
+    def evaluate_scalar(self, values: list[np.ndarray],
+                        parameters: dict[str, float]) -> np.ndarray:
+        """Evaluates the expression with eval() once per sample value."""
+        return np.array([self.evaluate_sample(sample, parameters)
+                         for sample in zip(*(value.tolist()
+                                             for value in values))],
+                        dtype=np.float64)
+
+    def evaluate_sample(self, sample: tuple[float, ...],
+                        parameters: dict[str, float]) -> float:
+        """
+        Evaluates the expression for one sample, giving NaN outside the
+        domain of the function like the vectorized path does.
+
+        :param sample: One value per free variable.
+        :param parameters: Values of the named free parameters.
+        :return: The result, or NaN if it is undefined.
+        """
+        try:
+            return eval(self.scalar_code, self.namespace,
+                        {**parameters, **dict(zip(self.variables, sample))})
+        except (ArithmeticError, ValueError):
+            # E.g., math.log(0, 2); other errors are mistakes in the row
+            return math.nan
+
+
+def share_terms(expressions: list[CompiledExpression],
+                cache: TermCache) -> int:
+    """
+    Plans the evaluation of a set of expressions, e.g., those of every row
+    of a definition file: subexpressions found in more than one of them
+    are evaluated once per set of sample values through the cache, and
+    the others inline as before.
+
+    :param expressions: The compiled expressions.
+    :param cache: The TermCache holding the shared results.
+    :return: The number of shared subexpressions.
+    """
+    counts = Counter(key for expression in expressions
+                     for key in expression.terms)
+    shared = {key for key, count in counts.items() if count > 1}
+    compiled = {}
+    for expression in expressions:
+        expression.share(shared, cache, compiled)
+    return len(shared)
+
+
+def compile_expression(source: str, *variables: str) -> CompiledExpression:
+    """
+    Compiles an expression string for evaluation over sample arrays.
+
+    :param source: The expression string from graphs.csv.
+    :param variables: Names of the free variables ("x" or "t", or "x" and
+                      "y").
+    :return: A CompiledExpression object.
+    """
+    return CompiledExpression(source, *variables)
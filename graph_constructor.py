@@ -1,88 +1,135 @@
-import csv
-import math
+import argparse
+import os
 import sys
-from ast import literal_eval
+import time
 from typing import List, Tuple, Union
 
 import pygame as pg
 
-from classes import CoordinateSystem, Graph, ParametricGraph
-from constants import WIDTH, HEIGHT, WHITE, clock, screen
+from classes import CoordinateSystem, Scene
+from constants import WIDTH, HEIGHT, frame_rate, pan_speed, sample_cache_dir
+from definitions import DefinitionWatcher, get_input, read_definitions
+from graphs import Graph, ParametricGraph, create_graph
+from headless import parse_size, parse_view, render_png, render_svg, view_axes
+from parallel import ParallelSampler
+from profiler import profiler
+from rendering import exposed_rects
+from sample_cache import SampleCache
+from sweep import Sweep
+from tiles import TileCache
 
-pg.init()
+# Posted by the background sampling thread when new samples are ready
+SAMPLES_READY = pg.event.custom_type()
 
+# State of the last frame drawn by draw_all as (origin, other view state)
+drawn_frame = None
 
-def get_input(axes) -> List[Union[Tuple[str, str, str, str, float],
-                              Tuple[str, str, str]]]:
+# Arrow keys and the direction they move the origin in
+PAN_KEYS = {pg.K_LEFT: (1, 0), pg.K_RIGHT: (-1, 0),
+            pg.K_UP: (0, 1), pg.K_DOWN: (0, -1)}
+
+
+def reload_scene(scene: Scene, path: str) -> None:
     """
-    Reads graphs from the CSV file, supporting both standard and
-    parametric graphs.
+    Re-read the definitions file and update the scene in place, keeping
+    the samples of unchanged graphs. A file that cannot be parsed leaves
+    the scene as it was, and rows that fail to evaluate are drawn empty.
 
-    :return: A list of tuples containing graph definitions. Each tuple includes
-             the graph type and its parameters. For parametric graphs,
-             the tuple includes ("parametric", x_func, y_func, color,
-                                 t_range, dt).
-             For standard graphs, it includes ("standard", functn,
-                                               color, borders).
+    :param scene: The Scene holding the graphs to draw.
+    :param path: Path to the graph definitions file.
     """
     try:
-        with open("graphs.csv", mode="r") as file:
-            reader = csv.reader(file, delimiter=";")
-            graphs = []
-            for row in reader:
-                if row[0].startswith("#"):  # Skip comments
-                    continue
-                if len(row) == 5:  # Parametric graph
-                    x_func, y_func, color, t_range, dt = row
-                    t_range = eval(t_range)
-                    graphs.append(("parametric", x_func, y_func,
-                                   color, t_range, float(dt)))
-                elif len(row) == 3:  # Standard graph
-                    func, color, x_range = row
-                    x_range = literal_eval(row[2])
-                    graphs.append(("standard", func, color, x_range))
-            return graphs
+        added, removed = scene.update(read_definitions(path))
     except Exception as e:
-        print(f"Error reading input: {e}")
-        sys.exit(1)
+        print(f"Error reloading input: {e}")
+        return
+    print(f"Reloaded {path}: {added} added, {removed} removed")
 
 
 def create_graph_objects(
-        axes,
-        zero: Tuple[int, int],
-        units: Tuple[int, int]
+        inputs: List[Union[Tuple[str, str, str, str, float],
+                           Tuple[str, str, str]]]
 ) -> List[Union[Graph, ParametricGraph]]:
     """
     Create graph objects from input data.
 
-    :param zero: Tuple containing the x and y coordinates of the origin.
-    :param units: Tuple containing the pixel-to-unit ratios
-                  for the x and y axes.
+    :param inputs: Graph definitions as returned by get_input.
     :return: A list of Graph and ParametricGraph objects.
     """
-    inputs = get_input(axes)
-    graph_objects = []
-    for graph_type, *params in inputs:
-        if graph_type == "parametric":
-            x_func, y_func, color, t_range, dt = params
-            graph_objects.append(ParametricGraph(
-                zero, units, x_func, y_func, color, t_range, dt))
-        elif graph_type == "standard":
-            functn, color, borders = params
-            graph_objects.append(Graph(zero, units, functn, color, borders))
-    return graph_objects
+    return [create_graph(definition) for definition in inputs]
+
+
+def post_samples_ready() -> None:
+    """
+    Wake up the event loop to show newly sampled graphs.
+    """
+    pg.event.post(pg.event.Event(SAMPLES_READY))
+
+
+def load_scene(path: str = "graphs.csv",
+               sampler: ParallelSampler = None,
+               background: bool = False,
+               tiles: TileCache = None,
+               cache: SampleCache = None) -> Scene:
+    """
+    Read the graph definitions once and build the scene.
+
+    :param path: Path to the graph definitions file.
+    :param sampler: Optional worker pool used to sample the graphs.
+    :param background: Whether to sample on a background thread, posting
+                       SAMPLES_READY when new samples can be drawn.
+    :param tiles: Optional TileCache to draw the curves from.
+    :param cache: Optional on-disk SampleCache for the samples.
+    :return: A Scene holding the graphs.
+    """
+    with profiler.stage("parse"):
+        inputs = get_input(path)
+    with profiler.stage("build"):
+        graphs = create_graph_objects(inputs)
+    return Scene(graphs, sampler, background, post_samples_ready, tiles,
+                 cache)
+
+
+def add_evaluation_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the options controlling parallel curve evaluation.
 
+    :param parser: The parser to extend.
+    """
+    parser.add_argument("--workers", type=int, default=0,
+                        help="evaluate curves in this many worker "
+                             "processes (default: serial)")
+    parser.add_argument("--chunk-size", type=int, default=4,
+                        help="curves sent to a worker at once")
+    parser.add_argument("--cache", nargs="?", const=sample_cache_dir,
+                        metavar="DIR",
+                        help="keep sampled curves in this directory "
+                             f"(default: {sample_cache_dir}) and reuse "
+                             "them on the next start")
+
+
+def create_sampler(args: argparse.Namespace) -> ParallelSampler:
+    """
+    Create the worker pool requested on the command line.
 
-def draw_graph_objects(
-    graph_objects: List[Union[Graph, ParametricGraph]]
-) -> None:
+    :param args: Parsed arguments with workers and chunk_size.
+    :return: A ParallelSampler, or None for serial evaluation.
     """
-    Draw the graph objects on the screen.
+    if args.workers > 1:
+        return ParallelSampler(args.workers, args.chunk_size)
+    return None
+
 
-    :param graph_objects: A list of Graph and ParametricGraph objects to draw.
+def create_cache(args: argparse.Namespace) -> SampleCache:
     """
-    for graph_object in graph_objects:
-        graph_object.draw()
+    Open the sample cache requested on the command line.
+
+    :param args: Parsed arguments with cache.
+    :return: A SampleCache, or None if caching is disabled.
+    """
+    if args.cache is not None:
+        return SampleCache(args.cache)
+    return None
 
 
 def get_new_center(zero: Tuple[int, int],
@@ -115,77 +162,169 @@ def get_new_center(zero: Tuple[int, int],
     return new_x_0, new_y_0
 
 
-def draw_all(axes: CoordinateSystem) -> None:
+def scroll_offset(axes: CoordinateSystem, scene: Scene,
+                  sweep: Sweep = None) -> Tuple[int, int]:
+    """
+    Find out whether the last frame can be reused by scrolling it: only
+    the origin may have moved since, by whole pixels and by less than the
+    screen size, and no overlay may be shown.
+
+    :param axes: The CoordinateSystem object
+                 representing the current grid and axes.
+    :param scene: The Scene holding the graphs to draw.
+    :param sweep: Optional Sweep whose slider is drawn over the frame.
+    :return: The (dx, dy) scroll in pixels, or None for a full redraw.
+    """
+    if (drawn_frame is None or profiler.hud_visible
+            or (sweep is not None and sweep.name is not None)):
+        return None
+    zero, state = drawn_frame
+    if state != (axes.units, axes.extra_grid_flag, scene.revision):
+        return None
+    dx = axes.x_0 - zero[0]
+    dy = axes.y_0 - zero[1]
+    if (dx != int(dx) or dy != int(dy)
+            or abs(dx) >= axes.width or abs(dy) >= axes.height):
+        return None
+    return int(dx), int(dy)
+
+
+def scroll_frame(surface: pg.Surface, axes: CoordinateSystem,
+                 scene: Scene, offset: Tuple[int, int]) -> None:
+    """
+    Scroll the last frame and paint only the strips it exposes.
+
+    :param surface: The display surface holding the last frame.
+    :param axes: The CoordinateSystem object
+                 representing the current grid and axes.
+    :param scene: The Scene holding the graphs to draw.
+    :param offset: The (dx, dy) scroll in pixels.
+    """
+    dx, dy = offset
+    surface.scroll(dx, dy)
+    for rect in exposed_rects(axes.width, axes.height, dx, dy):
+        surface.set_clip(rect)
+        axes.paint(surface)
+        scene.draw(axes, surface, rect)
+    surface.set_clip(None)
+
+
+def draw_all(axes: CoordinateSystem, scene: Scene,
+             sweep: Sweep = None) -> None:
     """
-    Redraw all elements on the screen.
+    Redraw all elements on the screen. When only the origin has moved
+    since the last frame, the frame is scrolled and just the exposed
+    strips are painted.
 
     :param axes: The CoordinateSystem object
                  representing the current grid and axes.
+    :param scene: The Scene holding the graphs to draw.
+    :param sweep: Optional Sweep whose slider is drawn over the graphs.
+    """
+    global drawn_frame
+    surface = pg.display.get_surface()
+    with profiler.stage("sample"):
+        scene.project(axes)
+    offset = scroll_offset(axes, scene, sweep)
+    if offset is not None:
+        with profiler.stage("scroll"):
+            scroll_frame(surface, axes, scene, offset)
+    else:
+        with profiler.stage("axes"):
+            axes.draw(surface)
+        with profiler.stage("curves"):
+            scene.draw(axes, surface)
+    drawn_frame = (axes.zero, (axes.units, axes.extra_grid_flag,
+                               scene.revision))
+    profiler.count("curves", len(scene.graphs))
+    profiler.count("visible", len(scene.visible))
+    profiler.count("samples", sum(len(graph.world_x)
+                                  for graph in scene.visible))
+    if scene.tiles is not None:
+        profiler.count("tiles", len(scene.tiles.tiles))
+    if sweep is not None:
+        sweep.draw(surface)
+    if profiler.hud_visible:
+        profiler.draw_hud(surface)
+    # Every pixel has moved, so the whole display is updated either way
+    with profiler.stage("display"):
+        pg.display.update()
+    profiler.end_frame()
+
+
+def redraw(axes: CoordinateSystem, scene: Scene) -> None:
     """
-    my_graphs = create_graph_objects(axes, axes.zero, axes.units)
-    screen.fill(WHITE)
-    axes.draw()
-    draw_graph_objects(my_graphs)
-    pg.display.update()
+    Snap the origin to the grid, then re-project and redraw the axes and
+    graphs.
 
+    :param axes: The CoordinateSystem object
+                 representing the current grid and axes.
+    :param scene: The Scene holding the graphs to draw.
+    """
+    snap_to_grid(axes)
+    draw_all(axes, scene)
 
-def redraw(axes: CoordinateSystem) -> None:
+
+def snap_to_grid(axes: CoordinateSystem) -> None:
     """
-    Recalculate and redraw the axes and graphs.
+    Move the origin to the nearest grid multiple.
 
     :param axes: The CoordinateSystem object
                  representing the current grid and axes.
     """
     axes.x_0, axes.y_0 = get_new_center(axes.zero, axes.units)
-    draw_all(axes)
 
 
-def reset(axes: CoordinateSystem) -> None:
+def reset(axes: CoordinateSystem, scene: Scene = None) -> None:
     """
     Reset the axes to their default state.
 
     :param axes: The CoordinateSystem object
                  representing the current grid and axes.
+    :param scene: The Scene holding the graphs to draw, or None to only
+                  reset the axes and leave drawing to the caller.
     """
     axes.x_unit = 40
     axes.y_unit = 40
     axes.x_0 = WIDTH // 2
     axes.y_0 = HEIGHT // 2
-    draw_all(axes)
+    if scene is not None:
+        draw_all(axes, scene)
 
 
-def handle_movement(keys, axes: CoordinateSystem) -> None:
+def handle_movement(keys, axes: CoordinateSystem, elapsed: float) -> bool:
     """
-    Handle key press events for zooming and panning.
+    Pan the origin at pan_speed pixels per second while arrow keys are
+    held.
 
     :param keys: Result of pg.key.get_pressed()
     :param axes: The CoordinateSystem object representing the current
                  grid and axes.
+    :param elapsed: Seconds since the previous movement step.
+    :return: True if an arrow key is held and the view needs a redraw.
     """
-    if keys[pg.K_LEFT]:
-        axes.x_0 += axes.x_unit
-        redraw(axes)
-    if keys[pg.K_DOWN]:
-        axes.y_0 -= axes.y_unit
-        redraw(axes)
-    if keys[pg.K_RIGHT]:
-        axes.x_0 -= axes.x_unit
-        redraw(axes)
-    if keys[pg.K_UP]:
-        axes.y_0 += axes.y_unit
-        redraw(axes)
+    step = round(pan_speed * elapsed)
+    moving = False
+    for key, (x_direction, y_direction) in PAN_KEYS.items():
+        if keys[key]:
+            axes.x_0 += x_direction * step
+            axes.y_0 += y_direction * step
+            moving = True
+    return moving
 
 
 def handle_key_events(events: List[pg.event.Event],
-                      axes: CoordinateSystem) -> None:
+                      axes: CoordinateSystem) -> bool:
     """
-    Handle key press events for zooming, panning,
-    reseting and toggling extra grid displaying.
+    Handle key press events for zooming, reseting and toggling extra grid
+    and HUD displaying.
 
     :param events: A list of events to process.
     :param axes: The CoordinateSystem object representing the current
                  grid and axes.
+    :return: True if the view needs a redraw.
     """
+    dirty = False
     for event in events:
         if event.type == pg.KEYDOWN:
 
@@ -193,75 +332,264 @@ def handle_key_events(events: List[pg.event.Event],
             if event.key == pg.K_KP_PLUS:  # Zoom in
                 axes.x_unit *= 2
                 axes.y_unit *= 2
-                redraw(axes)
+                snap_to_grid(axes)
+                dirty = True
             elif event.key == pg.K_KP_MINUS:  # Zoom out
                 axes.x_unit = max(20, axes.x_unit * 0.5)
                 axes.y_unit = max(20, axes.y_unit * 0.5)
-                redraw(axes)
+                snap_to_grid(axes)
+                dirty = True
 
             # Reset
             if event.key == pg.K_KP_0:
                 reset(axes)
+                dirty = True
 
             # Toggle extra grid
             if event.key == pg.K_KP_DIVIDE:
                 axes.extra_grid_flag = not axes.extra_grid_flag
-                redraw(axes)
+                dirty = True
+
+            # Toggle the profiler HUD
+            if event.key == pg.K_F3:
+                profiler.hud_visible = not profiler.hud_visible
+                dirty = True
+    return dirty
 
 
 def handle_mouse_events(events: List[pg.event.Event],
-                        axes: CoordinateSystem) -> None:
+                        axes: CoordinateSystem,
+                        ignore: pg.Rect = None) -> bool:
     """
     Handle mouse button events (move origin on click).
 
     :param events: A list of events to process.
     :param axes: The CoordinateSystem object representing the current
                  grid and axes.
+    :param ignore: Optional screen rectangle, e.g., of a slider, in which
+                   clicks do not move the origin.
+    :return: True if the view needs a redraw.
     """
+    dirty = False
     for event in events:
         if event.type == pg.MOUSEBUTTONDOWN:
-            x_pos, y_pos = pg.mouse.get_pos()
-            axes.x_0, axes.y_0 = get_new_center((x_pos, y_pos),
-                                                axes.units,
+            if ignore is not None and ignore.collidepoint(event.pos):
+                continue
+            axes.x_0, axes.y_0 = get_new_center(event.pos, axes.units,
                                                 mouse_click=True)
+            dirty = True
+    return dirty
+
+
+def handle_sweep_events(events: List[pg.event.Event], sweep: Sweep) -> bool:
+    """
+    Handle the parameter sweep controls: space to play or pause, tab to
+    select the next parameter, [ and ] to step it down or up, and
+    dragging the slider.
+
+    :param events: A list of events to process.
+    :param sweep: The Sweep holding the parameter values.
+    :return: True if the view needs a redraw.
+    """
+    dirty = False
+    for event in events:
+        if event.type == pg.KEYDOWN:
+            if event.key == pg.K_SPACE:
+                dirty |= sweep.toggle()
+            elif event.key == pg.K_TAB:
+                dirty |= sweep.select_next()
+            elif event.key == pg.K_LEFTBRACKET:
+                dirty |= sweep.nudge(-1)
+            elif event.key == pg.K_RIGHTBRACKET:
+                dirty |= sweep.nudge(1)
+        elif event.type == pg.MOUSEBUTTONDOWN and sweep.hit(event.pos):
+            sweep.dragging = True
+            dirty |= sweep.drag(event.pos)
+        elif event.type == pg.MOUSEMOTION and sweep.dragging:
+            dirty |= sweep.drag(event.pos)
+        elif event.type == pg.MOUSEBUTTONUP:
+            sweep.dragging = False
+    return dirty
 
 
 def handle_other_events(events: List[pg.event.Event],
-                        axes: CoordinateSystem) -> None:
+                        scene: Scene) -> bool:
     """
-    Handle other events like quitting, etc.
+    Handle other events like quitting, finished sampling, etc.
 
     :param events: A list of events to process.
-    :param axes: The CoordinateSystem object representing the current
-                 grid and axes.
+    :param scene: The Scene holding the graphs to draw.
+    :return: True if the view needs a redraw.
     """
+    global drawn_frame
+    dirty = False
     for event in events:
-        if event.type == pg.QUIT:
+        if event.type == SAMPLES_READY:
+            dirty = True
+        elif event.type == pg.WINDOWEXPOSED:
+            # The window content may be lost, so it cannot be scrolled
+            drawn_frame = None
+            dirty = True
+        elif event.type == pg.QUIT:
+            if profiler.trace_path is not None:
+                profiler.dump()
+            scene.close()
             pg.quit()
             sys.exit()
+    return dirty
+
+
+class App:
+    """The interactive plotter. The window, clock, view and scene are
+    created when the app is constructed, not when modules are imported,
+    so parsing and evaluation can be used without a display."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        """
+        Opens the window and loads the scene.
+
+        :param args: Parsed arguments of main.
+        """
+        pg.init()
+        pg.display.set_caption("My Graph")
+        self.screen = pg.display.set_mode((WIDTH, HEIGHT))
+        self.clock = pg.time.Clock()
+
+        self.path = args.file
+        tiles = TileCache(budget=args.tiles * 2 ** 20) if args.tiles \
+            else None
+        self.axes = CoordinateSystem()
+        self.scene = load_scene(args.file, create_sampler(args),
+                                background=True, tiles=tiles,
+                                cache=create_cache(args))
+        self.watcher = DefinitionWatcher(args.file)
+        self.sweep = Sweep()
+        self.sweep.update(self.scene.graphs)
+        reset(self.axes)
+
+    def run(self) -> None:
+        """
+        Main loop for the program, handling events and user input.
+
+        The loop sleeps in pg.event.wait while nothing changes, waking up
+        only for input, finished background sampling and polls of the
+        definitions file. Input marks the view dirty, and a dirty view is
+        drawn at most frame_rate times per second. While a parameter
+        sweep plays, every frame moves the parameter on; the scene samples
+        the new values in the background while the last ones are drawn.
+        """
+        axes, scene, sweep = self.axes, self.scene, self.sweep
+        dirty = True
+        moving = False
+        last_step = time.perf_counter()
+        while True:
+            if dirty or moving or sweep.playing:
+                events = pg.event.get()
+            else:
+                # Idle: block until an event arrives or the file is due a
+                # poll
+                event = pg.event.wait(int(self.watcher.interval * 1000))
+                events = [event] + pg.event.get()
+
+            if self.watcher.changed():
+                reload_scene(scene, self.path)
+                sweep.update(scene.graphs)
+                dirty = True
+
+            # Handle all events: key, mouse, sweep and other
+            stepping = moving or sweep.playing
+            dirty |= handle_key_events(events, axes)
+            dirty |= handle_mouse_events(events, axes, sweep.rect)
+            dirty |= handle_sweep_events(events, sweep)
+            dirty |= handle_other_events(events, scene)
+
+            # Pan and sweep by the time elapsed since the previous step;
+            # the first step of a key press or a sweep moves by one frame
+            now = time.perf_counter()
+            elapsed = now - last_step if stepping else 1 / frame_rate
+            last_step = now
+            moving = handle_movement(pg.key.get_pressed(), axes,
+                                     min(elapsed, 0.1))
+            dirty |= moving
+            dirty |= sweep.advance(min(elapsed, 0.1))
+
+            if dirty:
+                scene.set_values(sweep.values)
+                draw_all(axes, scene, sweep)
+                dirty = False
+                self.clock.tick(frame_rate)
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Parse the command line and run the interactive plotter.
 
-
-def main() -> None:
+    :param argv: Command line arguments.
     """
-    Main loop for the program, handling events and user input.
+    parser = argparse.ArgumentParser(
+        prog="python graph_constructor.py",
+        description="Interactive graph plotter.")
+    parser.add_argument("file", nargs="?", default="graphs.csv",
+                        help="graph definition CSV file")
+    add_evaluation_arguments(parser)
+    parser.add_argument("--trace",
+                        help="write per-frame stage timings to this JSON "
+                             "(or .csv) file on exit")
+    parser.add_argument("--tiles", type=int, metavar="MB",
+                        help="draw curves from a tile cache of this many "
+                             "megabytes, reused across pans and zoom levels")
+    args = parser.parse_args(argv)
+    profiler.trace_path = args.trace
+    App(args).run()
+
+
+def render(argv: List[str]) -> None:
     """
-    pg.display.set_caption("My Graph")
-    axes = CoordinateSystem()
-    reset(axes)
+    Render graph definition files to images without opening a window.
 
-    running = True
-    while running:
-        clock.tick(10)
-        # Get all keys and events once per frame
-        keys = pg.key.get_pressed()
-        events = pg.event.get()
+    Every file is rendered once per requested view in the same process,
+    so pygame is initialized only once for the whole batch.
 
-        # Handle all events: key, mouse, and other
-        handle_movement(keys, axes)
-        handle_key_events(events, axes)
-        handle_mouse_events(events, axes)
-        handle_other_events(events, axes)
+    :param argv: Command line arguments following "render".
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m graph_constructor render",
+        description="Render graph definition files to PNG (and SVG).")
+    parser.add_argument("files", nargs="+",
+                        help="graph definition CSV files")
+    parser.add_argument("--out", default=".",
+                        help="output directory (default: current)")
+    parser.add_argument("--size", type=parse_size, default=(WIDTH, HEIGHT),
+                        help="image size as WIDTHxHEIGHT")
+    parser.add_argument("--view", type=parse_view, action="append",
+                        help="world window as x_min,x_max,y_min,y_max; "
+                             "may be repeated")
+    parser.add_argument("--svg", action="store_true",
+                        help="also write SVG polylines")
+    add_evaluation_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # Only the label font is needed; no display is initialized
+    pg.font.init()
+    os.makedirs(args.out, exist_ok=True)
+    views = args.view or [None]
+    sampler = create_sampler(args)
+    cache = create_cache(args)
+    for path in args.files:
+        scene = load_scene(path, sampler, cache=cache)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for index, view in enumerate(views):
+            name = stem if len(views) == 1 else f"{stem}_{index}"
+            axes = view_axes(view, args.size)
+            render_png(scene, axes, os.path.join(args.out, name + ".png"))
+            if args.svg:
+                render_svg(scene, axes, os.path.join(args.out, name + ".svg"))
+    if sampler is not None:
+        sampler.close()
 
 
 if __name__ == '__main__':
-    main()
+    if sys.argv[1:2] == ["render"]:
+        render(sys.argv[2:])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,627 @@
+import math
+import os
+
+import numpy as np
+
+from constants import (samples_per_pixel, chunk_size, adaptive_sampling,
+                       adaptive_step, adaptive_tolerance, adaptive_depth,
+                       discontinuity_jump, implicit_step, implicit_depth)
+from contours import trace_contour
+from expressions import CompiledExpression, compile_expression
+from sampling import refine
+from series import build_pyramid, decimate_series, open_series
+from spatial import UNBOUNDED, overlapping
+
+
+def expand_viewport(viewport: tuple[float, float, float, float],
+                    margin: float) -> tuple[float, float, float, float]:
+    """
+    Grows a world window on every side by a fraction of its size.
+
+    :param viewport: (x_min, x_max, y_min, y_max) world window.
+    :param margin: Extra size on each side, in window widths/heights.
+    :return: The expanded window.
+    """
+    x_min, x_max, y_min, y_max = viewport
+    x_pad = (x_max - x_min) * margin
+    y_pad = (y_max - y_min) * margin
+    return x_min - x_pad, x_max + x_pad, y_min - y_pad, y_max + y_pad
+
+
+class Graph:
+    """Represents a graph of a function with specified borders and color,
+    sampled in world coordinates as an (N, 2) array of (x, y) rows."""
+
+    __slots__ = ("A", "B", "functn", "color", "adaptive", "expression",
+                 "parameters", "values", "bounds", "sampled_window",
+                 "sampled_units", "world", "buffer", "pixels", "definition")
+
+    def __init__(self, functn: str, color: tuple[int, int, int],
+                 borders: tuple[float, float],
+                 parameters: tuple[tuple[str, float, float], ...] = (),
+                 adaptive: bool = adaptive_sampling) -> None:
+        """
+        Initializes the graph with the provided parameters.
+
+        :param functn: The mathematical function as a string,
+        e.g., "math.sin(x)".
+        :param color: RGB tuple or predefined color name.
+        :param borders: (A, B) range of x-values for the graph.
+        :param parameters: (name, low, high) of the free parameters used
+                           in the function, e.g., ("a", 0.5, 3.0); each
+                           starts at its low end.
+        :param adaptive: Whether to use curvature-driven refinement
+                         instead of uniform sampling.
+        """
+        self.A = borders[0]
+        self.B = borders[1]
+
+        self.functn = functn
+        self.color = color
+        self.adaptive = adaptive
+        self.expression = compile_expression(functn, "x")
+        self.parameters = parameters
+        self.values = {name: low for name, low, _ in parameters}
+        # World bounds of the whole curve, None while unknown
+        self.bounds = (self.A, self.B, -math.inf, math.inf)
+
+        self.clear_samples()
+
+    def clear_samples(self) -> None:
+        """Starts without samples, with an empty pixel buffer to reuse."""
+        self.sampled_window = None
+        self.sampled_units = None
+
+        self.world = np.empty((0, 2))
+        self.buffer = np.empty((0, 2))
+        self.pixels = self.buffer
+
+    @property
+    def world_x(self) -> np.ndarray:
+        """Returns the world x of the samples."""
+        return self.world[:, 0]
+
+    @property
+    def world_y(self) -> np.ndarray:
+        """Returns the world y of the samples."""
+        return self.world[:, 1]
+
+    @property
+    def x_values(self) -> np.ndarray:
+        """Returns the pixel x of the samples, as of the last projection."""
+        return self.pixels[:, 0]
+
+    @property
+    def y_values(self) -> np.ndarray:
+        """Returns the pixel y of the samples, as of the last projection."""
+        return self.pixels[:, 1]
+
+    @property
+    def expressions(self) -> tuple[CompiledExpression, ...]:
+        """Returns the compiled expressions the curve is evaluated with."""
+        return (self.expression,)
+
+    @property
+    def uses_y_range(self) -> bool:
+        """Returns whether the samples depend on the y-range of the
+        sampled window, which is so in adaptive mode, as intervals
+        outside it are not refined."""
+        return self.adaptive
+
+    @property
+    def parameter_key(self) -> tuple:
+        """Returns the parameter values to add to curve_key, if any."""
+        return (tuple(self.values.items()),) if self.values else ()
+
+    @property
+    def curve_key(self) -> tuple:
+        """Returns everything the samples depend on, except the window."""
+        return ("standard", self.functn, self.A, self.B,
+                self.adaptive) + self.parameter_key
+
+    def set_parameters(self, values: dict[str, float]) -> bool:
+        """
+        Takes the values of the graph's free parameters from a mapping of
+        all parameter values, dropping the samples if any has changed.
+
+        :param values: Parameter values by name; missing ones are kept.
+        :return: True if the graph needs to be sampled again.
+        """
+        changed = False
+        for name in self.values:
+            value = values.get(name, self.values[name])
+            if value != self.values[name]:
+                self.values[name] = value
+                changed = True
+        if changed:
+            self.sampled_window = None
+        return changed
+
+    def covers(self, viewport: tuple[float, float, float, float],
+               units: tuple[int, int]) -> bool:
+        """
+        Checks whether the current samples are valid for the given view.
+
+        :param viewport: (x_min, x_max, y_min, y_max) visible world window.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: True if no resampling is needed.
+        """
+        if self.sampled_window is None or units != self.sampled_units:
+            return False
+        x_min, x_max, y_min, y_max = self.sampled_window
+        if not (x_min <= viewport[0] and viewport[1] <= x_max):
+            return False
+        return not self.uses_y_range or (y_min <= viewport[2]
+                                         and viewport[3] <= y_max)
+
+    def sample(self, window: tuple[float, float, float, float],
+               units: tuple[int, int],
+               samples: tuple[np.ndarray, np.ndarray] = None) -> None:
+        """
+        Replaces the world-space samples with ones covering the window.
+
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :param samples: Already calculated (x, y) world arrays, e.g., from
+                        a worker process, or an (N, 2) array, e.g., from
+                        the sample cache; calculated here if omitted.
+        """
+        if samples is None:
+            samples = self.calculate_coordinates(window, units)
+        if isinstance(samples, tuple):
+            samples = np.column_stack(samples)
+        self.world = samples
+        self.sampled_window = window
+        self.sampled_units = units
+
+    def calculate_coordinates(self, window: tuple[float, float, float, float],
+                              units: tuple[int, int]
+                              ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Samples the function over the part of the borders inside the window.
+
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays.
+        """
+        x_min = max(self.A, window[0])
+        x_max = min(self.B, window[1])
+        if x_min > x_max:
+            x_values = np.empty(0)
+        elif self.adaptive:
+            n = math.ceil((x_max - x_min) * units[0] / adaptive_step)
+            x_values = np.linspace(x_min, x_max, n + 1)
+        else:
+            n = math.ceil((x_max - x_min) * units[0] * samples_per_pixel)
+            x_values = np.linspace(x_min, x_max, n + 1)
+        return self.sample_curve(x_values, window, units)
+
+    def calculate_bounds(self) -> None:
+        """Calculates bounds that are only known once the curve has been
+        evaluated; a function graph knows them from its borders."""
+
+    def try_calculate_coordinates(
+            self, window: tuple[float, float, float, float],
+            units: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Samples the curve like calculate_coordinates, printing an error in
+        the definition instead of raising it, e.g., a name that is not
+        defined yet while the row is being typed.
+
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays, or None if the evaluation failed.
+        """
+        try:
+            return self.calculate_coordinates(window, units)
+        except Exception as e:
+            print(f"Error evaluating {getattr(self, 'definition', self)}: "
+                  f"{e}")
+            return None
+
+    def evaluate(self, x_values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluates the function at the given x values.
+
+        :param x_values: Array of x values.
+        :return: (x, y) world arrays.
+        """
+        return x_values, self.expression(x_values, parameters=self.values)
+
+    def sample_curve(self, params: np.ndarray,
+                     window: tuple[float, float, float, float],
+                     units: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluates the curve at the given parameters, refining them first
+        in adaptive mode.
+
+        :param params: Increasing parameter values (x or t).
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays.
+        """
+        if self.adaptive:
+            return refine(self.evaluate, params, units, window,
+                          adaptive_tolerance, adaptive_depth,
+                          discontinuity_jump)
+        return self.evaluate(params)
+
+    def project(self, zero: tuple[int, int], units: tuple[int, int]) -> None:
+        """
+        Maps the world-space samples to pixel coordinates.
+
+        :param zero: (x_0, y_0) center of the coordinate system.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        """
+        n = len(self.world)
+        if n > len(self.buffer) or n < len(self.buffer) // 4:
+            # Leave room to grow, so that re-sampling rarely reallocates
+            self.buffer = np.empty((n + n // 4, 2))
+        self.pixels = self.buffer[:n]
+        x_unit, y_unit = units
+        np.multiply(self.world, (x_unit, -y_unit), out=self.pixels)
+        np.add(self.pixels, zero, out=self.pixels)
+
+
+class ParametricGraph(Graph):
+    """Represents a graph of a parametric equation defined by x(t) and y(t)."""
+
+    __slots__ = ("x_func", "y_func", "t0", "tN", "dt", "x_expression",
+                 "y_expression", "t_values", "coarse_x", "coarse_y",
+                 "chunk_starts", "chunk_ends", "chunk_boxes")
+
+    def __init__(self, x_func: str, y_func: str, color: tuple[int, int, int],
+                 t_range: tuple[float, float], dt: float,
+                 parameters: tuple[tuple[str, float, float], ...] = (),
+                 adaptive: bool = adaptive_sampling) -> None:
+        """
+        Initializes the parametric graph with the given parameters.
+
+        :param x_func: String defining x(t), e.g., "5 * math.cos(t)".
+        :param y_func: String defining y(t), e.g., "3 * math.sin(t)".
+        :param color: RGB tuple or predefined color name.
+        :param t_range: (t0, tN) range for the parameter t.
+        :param dt: Step size for t.
+        :param parameters: (name, low, high) of the free parameters used
+                           in x(t) and y(t).
+        :param adaptive: Whether to use curvature-driven refinement
+                         instead of uniform sampling.
+        """
+        self.x_func = x_func
+        self.y_func = y_func
+        self.color = color
+        self.adaptive = adaptive
+        self.t0, self.tN = t_range
+        self.dt = dt
+        self.x_expression = compile_expression(x_func, "t")
+        self.y_expression = compile_expression(y_func, "t")
+        self.parameters = parameters
+        self.values = {name: low for name, low, _ in parameters}
+
+        self.clear_samples()
+
+        # Calculated on first use, before the curve is sampled or loaded
+        # from the sample cache
+        self.chunk_boxes = None
+        self.bounds = None
+
+    def calculate_coarse(self) -> None:
+        """Evaluates the curve at the declared dt and calculates the chunk
+        bounding boxes."""
+        self.t_values = np.linspace(self.t0, self.tN, int(
+            (self.tN - self.t0) / self.dt) + 1)
+        self.coarse_x, self.coarse_y = self.evaluate(self.t_values)
+        self.calculate_chunk_boxes()
+
+    def calculate_bounds(self) -> None:
+        """Runs the coarse pass unless it has been run, leaving the bounds
+        unknown if it fails; the error is printed when the graph is
+        sampled."""
+        if self.chunk_boxes is None:
+            try:
+                self.calculate_coarse()
+            except Exception:
+                pass
+
+    def calculate_chunk_boxes(self) -> None:
+        """Splits the coarse samples into chunks of chunk_size steps and
+        records the world-space bounding box of each chunk and of the
+        whole curve."""
+        last = len(self.t_values) - 1
+        self.chunk_starts = np.arange(0, max(last, 1), chunk_size)
+        self.chunk_ends = np.minimum(self.chunk_starts + chunk_size, last)
+        boxes = []
+        for values in (self.coarse_x, self.coarse_y):
+            boxes.append(np.fmin(np.fmin.reduceat(values, self.chunk_starts),
+                                 values[self.chunk_ends]))
+            boxes.append(np.fmax(np.fmax.reduceat(values, self.chunk_starts),
+                                 values[self.chunk_ends]))
+        self.chunk_boxes = np.column_stack(boxes)
+
+        boxes = self.chunk_boxes[~np.isnan(self.chunk_boxes).any(axis=1)]
+        if len(boxes):
+            self.bounds = (boxes[:, 0].min(), boxes[:, 1].max(),
+                           boxes[:, 2].min(), boxes[:, 3].max())
+        else:
+            self.bounds = (math.inf, -math.inf, math.inf, -math.inf)
+
+    @property
+    def expressions(self) -> tuple[CompiledExpression, ...]:
+        """Returns the compiled expressions the curve is evaluated with."""
+        return self.x_expression, self.y_expression
+
+    @property
+    def curve_key(self) -> tuple:
+        """Returns everything the samples depend on, except the window."""
+        return ("parametric", self.x_func, self.y_func, self.t0, self.tN,
+                self.dt, self.adaptive) + self.parameter_key
+
+    def set_parameters(self, values: dict[str, float]) -> bool:
+        """
+        Takes the values of the graph's free parameters, dropping the
+        coarse curve along with the samples if any has changed.
+
+        :param values: Parameter values by name; missing ones are kept.
+        :return: True if the graph needs to be sampled again.
+        """
+        changed = super().set_parameters(values)
+        if changed:
+            self.chunk_boxes = None
+            self.bounds = None
+        return changed
+
+    @property
+    def uses_y_range(self) -> bool:
+        """Returns True, as chunks outside the window are skipped."""
+        return True
+
+    def visible_runs(self, window: tuple[float, float, float, float]
+                     ) -> list[tuple[int, int]]:
+        """
+        Finds the runs of adjacent chunks whose bounding box intersects
+        the window.
+
+        :param window: (x_min, x_max, y_min, y_max) world window.
+        :return: (first, last) chunk indices of each run.
+        """
+        chunks = np.flatnonzero(overlapping(self.chunk_boxes, window))
+        runs = np.split(chunks, np.flatnonzero(np.diff(chunks) != 1) + 1)
+        return [(run[0], run[-1]) for run in runs if len(run)]
+
+    def evaluate(self, t_values: np.ndarray
+                 ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluates x(t) and y(t) at the given parameter values.
+
+        :param t_values: Array of t values.
+        :return: (x, y) world arrays.
+        """
+        return (self.x_expression(t_values, parameters=self.values),
+                self.y_expression(t_values, parameters=self.values))
+
+    def calculate_coordinates(self, window: tuple[float, float, float, float],
+                              units: tuple[int, int]
+                              ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the world x and y coordinates of the visible chunks,
+        with a NaN break between runs of chunks that are not adjacent in t.
+
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays.
+        """
+        if self.chunk_boxes is None:
+            self.calculate_coarse()
+        runs = self.visible_runs(window)
+        if runs and not self.adaptive:
+            return self.sample_uniform(runs, units)
+
+        x_parts = []
+        y_parts = []
+        for first, last in runs:
+            start = self.chunk_starts[first]
+            end = self.chunk_ends[last]
+            x_values, y_values = self.sample_curve(
+                self.t_values[start:end + 1], window, units)
+            x_parts += [x_values, [np.nan]]
+            y_parts += [y_values, [np.nan]]
+
+        if not x_parts:
+            x_parts = y_parts = [np.empty(0), []]
+        return np.concatenate(x_parts[:-1]), np.concatenate(y_parts[:-1])
+
+    def sample_uniform(self, runs: list[tuple[int, int]],
+                       units: tuple[int, int]
+                       ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluates runs of chunks at about one sample per pixel of their
+        arc length, building the t values of every chunk at once.
+
+        :param runs: (first, last) chunks of the runs, as returned by
+                     visible_runs.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays, NaN between the runs.
+        """
+        # Steps across a pole count as nothing, like undefined ones
+        pixel_steps = np.nan_to_num(np.hypot(
+            np.diff(self.coarse_x) * units[0],
+            np.diff(self.coarse_y) * units[1]), posinf=0)
+        pixel_lengths = np.add.reduceat(np.append(pixel_steps, 0),
+                                        self.chunk_starts)
+
+        chunks = np.concatenate([np.arange(first, last + 1)
+                                 for first, last in runs])
+        starts = self.chunk_starts[chunks]
+        ends = self.chunk_ends[chunks]
+        steps = np.maximum(ends - starts, np.ceil(
+            pixel_lengths[chunks] * samples_per_pixel).astype(np.intp))
+        # The last chunk of a run also gets the t at its end
+        closing = np.cumsum([last - first + 1 for first, last in runs]) - 1
+        counts = steps.copy()
+        counts[closing] += 1
+
+        # t = start + k * step for k = 0, 1, ... within every chunk, as
+        # np.linspace would give
+        t_start = self.t_values[starts]
+        t_step = (self.t_values[ends] - t_start) / steps
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts)
+                                                      - counts, counts)
+        t_values = (np.repeat(t_step, counts) * offsets
+                    + np.repeat(t_start, counts))
+        run_ends = np.cumsum(counts)[closing] - 1
+        t_values[run_ends] = self.t_values[ends[closing]]
+
+        x_values, y_values = self.evaluate(t_values)
+        breaks = run_ends[:-1] + 1
+        return (np.insert(x_values, breaks, np.nan),
+                np.insert(y_values, breaks, np.nan))
+
+
+class DataGraph(Graph):
+    """Represents a measured data series of (x, y) points, x ascending,
+    memory-mapped from a binary or CSV file."""
+
+    __slots__ = ("path", "points", "pyramid")
+
+    def __init__(self, path: str, color: tuple[int, int, int]) -> None:
+        """
+        Opens the data series.
+
+        :param path: Path of the .bin, .npy or .csv file.
+        :param color: RGB tuple or predefined color name.
+        """
+        self.path = path
+        self.color = color
+        self.adaptive = False
+        self.parameters = ()
+        self.values = {}
+        self.points = open_series(path)
+        self.pyramid = build_pyramid(self.points)
+        if len(self.points):
+            top = self.pyramid[-1]
+            self.bounds = (self.points[0, 0], self.points[-1, 0],
+                           np.nanmin(top[:, 1]), np.nanmax(top[:, 2]))
+        else:
+            self.bounds = (math.inf, -math.inf, math.inf, -math.inf)
+
+        self.clear_samples()
+
+    @property
+    def expressions(self) -> tuple[CompiledExpression, ...]:
+        """Returns no expressions, as the points are read from a file."""
+        return ()
+
+    @property
+    def curve_key(self) -> tuple:
+        """Returns everything the samples depend on, except the window."""
+        stat = os.stat(self.path)
+        return "data", self.path, stat.st_mtime_ns, stat.st_size
+
+    def calculate_coordinates(self, window: tuple[float, float, float, float],
+                              units: tuple[int, int]
+                              ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Picks the points of the series needed to draw the window, reading
+        them through the min/max pyramid built on load.
+
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays.
+        """
+        x_min, x_max = window[:2]
+        columns = (x_max - x_min) * units[0] * samples_per_pixel
+        return decimate_series(self.points, self.pyramid, x_min, x_max,
+                               columns)
+
+
+class ImplicitGraph(Graph):
+    """Represents the curve f(x, y) = 0, e.g., a conic or a level set."""
+
+    __slots__ = ()
+
+    def __init__(self, functn: str, color: tuple[int, int, int],
+                 parameters: tuple[tuple[str, float, float], ...] = (),
+                 adaptive: bool = adaptive_sampling) -> None:
+        """
+        Initializes the implicit graph with the given parameters.
+
+        :param functn: String defining f(x, y), e.g., "x**2 + y**2 - 4".
+        :param color: RGB tuple or predefined color name.
+        :param parameters: (name, low, high) of the free parameters used
+                           in f(x, y).
+        :param adaptive: Whether to refine a coarse grid near the curve
+                         instead of evaluating a grid of pixel cells.
+        """
+        self.functn = functn
+        self.color = color
+        self.adaptive = adaptive
+        self.expression = compile_expression(functn, "x", "y")
+        self.parameters = parameters
+        self.values = {name: low for name, low, _ in parameters}
+        self.bounds = UNBOUNDED
+
+        self.clear_samples()
+
+    @property
+    def curve_key(self) -> tuple:
+        """Returns everything the samples depend on, except the window."""
+        return ("implicit", self.functn, self.adaptive) + self.parameter_key
+
+    @property
+    def uses_y_range(self) -> bool:
+        """Returns True, as the curve is only traced inside the window."""
+        return True
+
+    def calculate_coordinates(self, window: tuple[float, float, float, float],
+                              units: tuple[int, int]
+                              ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Traces the curve over the window with marching squares, on a grid
+        of pixel cells or, in adaptive mode, on a coarse grid refined only
+        where the curve passes.
+
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays, NaN between the pieces of the curve.
+        """
+        if self.adaptive:
+            step, depth = implicit_step, implicit_depth
+        else:
+            step, depth = 1 / samples_per_pixel, 0
+        return trace_contour(self.field, window, units, step, depth)
+
+    def field(self, x_values: np.ndarray,
+              y_values: np.ndarray) -> np.ndarray:
+        """
+        Evaluates f(x, y) at the given points.
+
+        :param x_values: Array of x values.
+        :param y_values: Array of y values of the same length.
+        :return: Array of f(x, y).
+        """
+        return self.expression(x_values, y_values, parameters=self.values)
+
+
+def create_graph(definition: tuple) -> Graph:
+    """
+    Creates a graph object from a definition returned by get_input.
+
+    :param definition: ("parametric", x_func, y_func, color, t_range, dt),
+                       ("standard", functn, color, borders),
+                       ("data", path, color) or ("implicit", functn, color),
+                       followed by the free parameters, if any.
+    :return: A Graph, ParametricGraph, DataGraph or ImplicitGraph object.
+    """
+    graph_type, *params = definition
+    if graph_type == "parametric":
+        graph = ParametricGraph(*params)
+    elif graph_type == "standard":
+        graph = Graph(*params)
+    elif graph_type == "data":
+        graph = DataGraph(*params)
+    elif graph_type == "implicit":
+        graph = ImplicitGraph(*params)
+    else:
+        raise ValueError(f"Unknown graph type: {graph_type}")
+    graph.definition = definition
+    return graph
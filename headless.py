@@ -0,0 +1,121 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import pygame as pg
+
+from classes import CoordinateSystem, Scene
+from constants import BLACK, LIGHT_GREEN
+from rendering import decimate_columns, finite_runs
+
+View = Tuple[float, float, float, float]
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    """
+    Parses an image size of the form WIDTHxHEIGHT.
+
+    :param text: The size string, e.g., "1200x800".
+    :return: (width, height) in pixels.
+    """
+    width, height = (int(value) for value in text.lower().split("x"))
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid size: {text}")
+    return width, height
+
+
+def parse_view(text: str) -> View:
+    """
+    Parses a world window of the form x_min,x_max,y_min,y_max.
+
+    :param text: The view string, e.g., "-10,10,-5,5".
+    :return: (x_min, x_max, y_min, y_max) world window.
+    """
+    x_min, x_max, y_min, y_max = (float(value) for value in text.split(","))
+    if x_min >= x_max or y_min >= y_max:
+        raise ValueError(f"Invalid view: {text}")
+    return x_min, x_max, y_min, y_max
+
+
+def view_axes(view: Optional[View],
+              size: Tuple[int, int]) -> CoordinateSystem:
+    """
+    Creates a coordinate system that shows the given world window.
+
+    :param view: (x_min, x_max, y_min, y_max) world window, or None for
+                 the default view centered on the origin.
+    :param size: (width, height) of the image in pixels.
+    :return: The CoordinateSystem for the image.
+    """
+    width, height = size
+    if view is None:
+        return CoordinateSystem(width // 2, height // 2, 40, 40,
+                                width, height)
+    x_min, x_max, y_min, y_max = view
+    x_unit = width / (x_max - x_min)
+    y_unit = height / (y_max - y_min)
+    return CoordinateSystem(round(-x_min * x_unit), round(y_max * y_unit),
+                            x_unit, y_unit, width, height)
+
+
+def render_png(scene: Scene, axes: CoordinateSystem, path: str) -> None:
+    """
+    Renders the axes and graphs to an off-screen surface and saves it.
+
+    :param scene: The Scene holding the graphs to draw.
+    :param axes: The CoordinateSystem describing the image.
+    :param path: Output file path; the format follows the extension.
+    """
+    surface = pg.Surface((axes.width, axes.height))
+    axes.draw(surface)
+    scene.draw(axes, surface)
+    pg.image.save(surface, path)
+
+
+def svg_color(color) -> str:
+    """Converts a color name or RGB tuple to an SVG rgb() value."""
+    color = pg.Color(color)
+    return f"rgb({color.r},{color.g},{color.b})"
+
+
+def svg_line(start: Tuple[float, float], end: Tuple[float, float],
+             color) -> str:
+    """Returns an SVG line element between two pixel positions."""
+    return (f'<line x1="{start[0]:.1f}" y1="{start[1]:.1f}" '
+            f'x2="{end[0]:.1f}" y2="{end[1]:.1f}" '
+            f'stroke="{svg_color(color)}" stroke-width="1"/>')
+
+
+def render_svg(scene: Scene, axes: CoordinateSystem, path: str) -> None:
+    """
+    Writes the grid, axes and graphs as SVG lines and polylines.
+
+    :param scene: The Scene holding the graphs to draw.
+    :param axes: The CoordinateSystem describing the image.
+    :param path: Output file path.
+    """
+    scene.project(axes)
+    width, height = axes.width, axes.height
+    elements = [f'<rect width="{width}" height="{height}" fill="white"/>']
+    elements += [svg_line((x, 0), (x, height), LIGHT_GREEN)
+                 for x in axes.x_axis_values]
+    elements += [svg_line((0, y), (width, y), LIGHT_GREEN)
+                 for y in axes.y_axis_values]
+    elements.append(svg_line((0, axes.y_0), (width, axes.y_0), BLACK))
+    elements.append(svg_line((axes.x_0, 0), (axes.x_0, height), BLACK))
+
+    for graph in scene.visible:
+        for run in finite_runs(graph.x_values, graph.y_values):
+            x_values, y_values = decimate_columns(graph.x_values[run],
+                                                  graph.y_values[run])
+            points = " ".join(f"{x:.2f},{y:.2f}" for x, y in
+                              np.column_stack((x_values, y_values)).tolist())
+            elements.append(f'<polyline points="{points}" fill="none" '
+                            f'stroke="{svg_color(graph.color)}" '
+                            f'stroke-width="1"/>')
+
+    with open(path, mode="w") as file:
+        file.write(f'<svg xmlns="http://www.w3.org/2000/svg" '
+                   f'width="{width}" height="{height}" '
+                   f'viewBox="0 0 {width} {height}">\n')
+        file.write("\n".join(elements))
+        file.write("\n</svg>\n")
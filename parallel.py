@@ -0,0 +1,71 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from graphs import Graph, create_graph
+
+Window = Tuple[float, float, float, float]
+
+
+def sample_definition(job: Tuple[tuple, dict, Window, Tuple[int, int]]
+                      ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Samples one graph definition inside a worker process.
+
+    :param job: (definition, parameter values, window, units) as passed
+                by ParallelSampler.
+    :return: (x, y) world arrays of float64, or None if the evaluation
+             failed.
+    """
+    definition, values, window, units = job
+    graph = create_graph(definition)
+    graph.set_parameters(values)
+    return graph.try_calculate_coordinates(window, units)
+
+
+class ParallelSampler:
+    """Evaluates graph definitions in a pool of worker processes.
+
+    Results are collected in submission order, so the samples are the
+    same as those of serial evaluation."""
+
+    def __init__(self, workers: int, chunk_size: int = 1) -> None:
+        """
+        Starts the worker pool.
+
+        :param workers: Number of worker processes.
+        :param chunk_size: Number of definitions sent to a worker at once.
+        """
+        self.chunk_size = chunk_size
+        # The pool is first used from the scene's background thread, and
+        # forking a process with other threads running can deadlock; the
+        # workers only need the pygame-free modules. Windows has no
+        # forkserver, but spawn works everywhere
+        method = ("forkserver" if "forkserver"
+                  in multiprocessing.get_all_start_methods() else "spawn")
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(method))
+
+    def calculate(self, graphs: List[Graph], window: Window,
+                  units: Tuple[int, int]
+                  ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Calculates samples of the graphs for the window in the workers.
+
+        :param graphs: Graphs created by create_graph.
+        :param window: (x_min, x_max, y_min, y_max) world window to cover.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: (x, y) world arrays for every graph, in order, or None
+                 for a graph whose evaluation failed.
+        """
+        jobs = [(graph.definition, graph.values, window, units)
+                for graph in graphs]
+        return list(self.executor.map(sample_definition, jobs,
+                                      chunksize=self.chunk_size))
+
+    def close(self) -> None:
+        """Shuts the worker pool down."""
+        self.executor.shutdown()
@@ -0,0 +1,127 @@
+import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import pygame as pg
+
+from constants import BLACK, WHITE
+
+
+class Profiler:
+    """Collects rolling per-stage timings and counts of the render loop
+    and shows them in an on-screen HUD or dumps them to a trace file."""
+
+    def __init__(self, window: int = 120) -> None:
+        """
+        Initializes empty statistics.
+
+        :param window: Number of recent measurements kept per stage.
+        """
+        self.window = window
+        self.timings: Dict[str, deque] = {}
+        self.counts: Dict[str, int] = {}
+        self.frame_times = deque(maxlen=window)
+        self.current: Dict[str, float] = {}
+
+        self.hud_visible = False
+        self.font = None
+        self.trace_path: Optional[str] = None
+        self.trace: List[Dict[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Times the enclosed block as the given stage.
+
+        :param name: Stage name, e.g., "axes".
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings.setdefault(
+                name, deque(maxlen=self.window)).append(elapsed)
+            self.current[name] = self.current.get(name, 0) + elapsed
+
+    def count(self, name: str, value: int) -> None:
+        """
+        Records the latest value of a counter, e.g., the sample count.
+
+        :param name: Counter name.
+        :param value: The counted value.
+        """
+        self.counts[name] = value
+        self.current[name] = value
+
+    def end_frame(self) -> None:
+        """Marks the end of a drawn frame."""
+        now = time.perf_counter()
+        self.frame_times.append(now)
+        if self.trace_path is not None:
+            self.trace.append({"time": now, **self.current})
+        self.current = {}
+
+    @property
+    def fps(self) -> float:
+        """Returns the frame rate over the recent frames."""
+        if len(self.frame_times) < 2:
+            return 0.0
+        elapsed = self.frame_times[-1] - self.frame_times[0]
+        return (len(self.frame_times) - 1) / elapsed if elapsed else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Returns the mean time in milliseconds of every stage."""
+        return {name: sum(values) / len(values)
+                for name, values in self.timings.items() if values}
+
+    def draw_hud(self, surface: pg.Surface) -> None:
+        """
+        Draws the frame rate, stage breakdown and counters.
+
+        :param surface: The surface to draw on.
+        """
+        if self.font is None:
+            self.font = pg.font.Font(None, 20)
+        font = self.font
+        lines = [f"FPS {self.fps:5.1f}"]
+        lines += [f"{name:<8} {mean:7.2f} ms"
+                  for name, mean in self.summary().items()]
+        lines += [f"{name:<8} {value:7d}"
+                  for name, value in self.counts.items()]
+        labels = [font.render(line, True, BLACK) for line in lines]
+        width = max(label.get_width() for label in labels) + 10
+        height = sum(label.get_height() for label in labels) + 10
+        panel = pg.Surface((width, height))
+        panel.fill(WHITE)
+        panel.set_alpha(210)
+        surface.blit(panel, (5, 5))
+        y = 10
+        for label in labels:
+            surface.blit(label, (10, y))
+            y += label.get_height()
+
+    def dump(self, path: str = None) -> None:
+        """
+        Writes the per-frame trace as JSON, or CSV if the path ends with
+        ".csv".
+
+        :param path: Output file path; defaults to trace_path.
+        """
+        path = path or self.trace_path
+        if path.endswith(".csv"):
+            columns = sorted({key for row in self.trace for key in row})
+            with open(path, mode="w", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.trace)
+        else:
+            with open(path, mode="w") as file:
+                json.dump({"summary_ms": self.summary(),
+                           "frames": self.trace}, file, indent=2)
+
+
+profiler = Profiler()
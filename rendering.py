@@ -0,0 +1,165 @@
+import numpy as np
+import pygame as pg
+
+from graphs import Graph
+
+# Pixel coordinates are clamped to this magnitude before drawing so that
+# samples far off-screen (e.g., next to a pole) stay valid for pygame
+PIXEL_LIMIT = 1e6
+
+
+def finite_runs(x_values: np.ndarray, y_values: np.ndarray) -> list[slice]:
+    """
+    Splits a polyline into runs of consecutive finite points.
+
+    :param x_values: Pixel x coordinates, NaN marks a break.
+    :param y_values: Pixel y coordinates, NaN marks a break.
+    :return: Slices of the runs with at least two points.
+    """
+    finite = np.isfinite(x_values) & np.isfinite(y_values)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], finite, [0]))))
+    return [slice(start, end) for start, end in zip(edges[::2], edges[1::2])
+            if end - start > 1]
+
+
+def decimate_columns(x_values: np.ndarray, y_values: np.ndarray
+                     ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces every run of consecutive points that fall into the same pixel
+    column to its first, lowest, highest and last point.
+
+    The drawn result is the same at pixel resolution, but a polyline
+    never needs many more points than twice the columns it crosses.
+
+    :param x_values: Finite pixel x coordinates.
+    :param y_values: Finite pixel y coordinates.
+    :return: The decimated (x, y) pixel coordinates.
+    """
+    n = len(x_values)
+    if n < 5:
+        return x_values, y_values
+    columns = np.floor(x_values)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(columns)) + 1))
+    if len(starts) * 4 >= n:
+        return x_values, y_values
+    ends = np.append(starts[1:], n) - 1
+
+    run_ids = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    indices = np.arange(n)
+    lowest = np.minimum.reduceat(y_values, starts)
+    highest = np.maximum.reduceat(y_values, starts)
+    lowest_at = np.minimum.reduceat(
+        np.where(y_values == lowest[run_ids], indices, n), starts)
+    highest_at = np.minimum.reduceat(
+        np.where(y_values == highest[run_ids], indices, n), starts)
+
+    keep = np.unique(np.concatenate((starts, lowest_at, highest_at, ends)))
+    return x_values[keep], y_values[keep]
+
+
+def decimate_polyline(x_values: np.ndarray, y_values: np.ndarray
+                      ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decimates every finite run of a polyline by pixel column.
+
+    Clipping afterwards keeps the segments of the whole run, so a strip
+    drawn alone matches the same strip of a full redraw.
+
+    :param x_values: Pixel x coordinates, NaN marks a break.
+    :param y_values: Pixel y coordinates, NaN marks a break.
+    :return: The decimated (x, y) pixel coordinates, runs broken by NaN.
+    """
+    x_parts, y_parts = [], []
+    for run in finite_runs(x_values, y_values):
+        x_run, y_run = decimate_columns(x_values[run], y_values[run])
+        x_parts += [x_run, [np.nan]]
+        y_parts += [y_run, [np.nan]]
+    if not x_parts:
+        return x_values[:0], y_values[:0]
+    return np.concatenate(x_parts[:-1]), np.concatenate(y_parts[:-1])
+
+
+def clip_to_rect(x_values: np.ndarray, y_values: np.ndarray,
+                 rect: pg.Rect) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Breaks a polyline everywhere outside a rectangle, keeping only the
+    end points of segments whose bounding box overlaps it. The rectangle
+    is grown by a pixel, since pygame truncates coordinates towards zero
+    and draws x in (-1, 0) into column 0.
+
+    :param x_values: Pixel x coordinates, NaN marks a break.
+    :param y_values: Pixel y coordinates, NaN marks a break.
+    :param rect: The pixel rectangle to keep.
+    :return: The (x, y) pixel coordinates with every other point NaN.
+    """
+    with np.errstate(invalid="ignore"):
+        x_a, x_b = x_values[:-1], x_values[1:]
+        y_a, y_b = y_values[:-1], y_values[1:]
+        crossing = ((np.fmin(x_a, x_b) <= rect.right + 1)
+                    & (np.fmax(x_a, x_b) >= rect.left - 1)
+                    & (np.fmin(y_a, y_b) <= rect.bottom + 1)
+                    & (np.fmax(y_a, y_b) >= rect.top - 1))
+    keep = np.zeros(len(x_values), dtype=bool)
+    keep[:-1] |= crossing
+    keep[1:] |= crossing
+    return (np.where(keep, x_values, np.nan),
+            np.where(keep, y_values, np.nan))
+
+
+def exposed_rects(width: int, height: int,
+                  dx: int, dy: int) -> list[pg.Rect]:
+    """
+    Lists the strips a surface scroll by (dx, dy) leaves uncovered, each
+    widened by the old edge line, where lines leaving the last frame were
+    cut off differently than a full redraw draws them.
+
+    :param width: Width of the surface in pixels.
+    :param height: Height of the surface in pixels.
+    :param dx: Horizontal scroll in pixels, positive to the right.
+    :param dy: Vertical scroll in pixels, positive downwards.
+    :return: The exposed rectangles, at most one per direction.
+    """
+    rects = []
+    if dx > 0:
+        rects.append(pg.Rect(0, 0, dx + 1, height))
+    elif dx < 0:
+        rects.append(pg.Rect(width + dx - 1, 0, 1 - dx, height))
+    if dy > 0:
+        rects.append(pg.Rect(0, 0, width, dy + 1))
+    elif dy < 0:
+        rects.append(pg.Rect(0, height + dy - 1, width, 1 - dy))
+    return rects
+
+
+def draw_polyline(surface: pg.Surface, color: tuple[int, int, int],
+                  x_values: np.ndarray, y_values: np.ndarray) -> None:
+    """
+    Draws a polyline with one pg.draw.lines call per finite run, as
+    given; decimate it first with decimate_polyline.
+
+    :param surface: The surface to draw on.
+    :param color: RGB tuple or predefined color name.
+    :param x_values: Pixel x coordinates, NaN marks a break.
+    :param y_values: Pixel y coordinates, NaN marks a break.
+    """
+    for run in finite_runs(x_values, y_values):
+        points = np.column_stack((x_values[run], y_values[run]))
+        np.clip(points, -PIXEL_LIMIT, PIXEL_LIMIT, out=points)
+        pg.draw.lines(surface, color, False, points.tolist(), 1)
+
+
+def draw_graph(surface: pg.Surface, graph: Graph,
+               rect: pg.Rect = None) -> None:
+    """
+    Draws a graph as batched polylines through its projected values,
+    broken wherever a value is not finite.
+
+    :param surface: The surface to draw on.
+    :param graph: The projected graph.
+    :param rect: Optional pixel rectangle; only the segments crossing it
+                 are drawn.
+    """
+    x_values, y_values = decimate_polyline(graph.x_values, graph.y_values)
+    if rect is not None:
+        x_values, y_values = clip_to_rect(x_values, y_values, rect)
+    draw_polyline(surface, graph.color, x_values, y_values)
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from constants import (samples_per_pixel, chunk_size, adaptive_step,
+                       adaptive_tolerance, adaptive_depth, discontinuity_jump,
+                       implicit_step, implicit_depth, sample_cache_dir,
+                       sample_cache_budget)
+
+# Bumped whenever the sampling algorithms change their output, so that
+# stale cache files are never loaded
+CACHE_VERSION = 1
+
+
+class SampleCache:
+    """Stores sampled curves on disk as .npy files of float64 (x, y) rows.
+
+    A file is named after a hash of the curve, the sampled window and
+    units, and every setting the samples depend on, so an unchanged
+    definition file loads its samples by memory-mapping them instead of
+    sampling the curves again. Files that have not been used for
+    the longest time are deleted once the directory exceeds its budget;
+    the size of the directory is kept as a running total, so it is only
+    scanned again when the budget is exceeded."""
+
+    def __init__(self, directory: str = sample_cache_dir,
+                 budget: int = sample_cache_budget) -> None:
+        """
+        Initializes the cache, creating the directory if needed and
+        measuring the files already in it.
+
+        :param directory: Directory holding the cache files.
+        :param budget: Maximum total size of the cache files in bytes.
+        """
+        self.directory = directory
+        self.budget = budget
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.size = sum(size for _, size, _ in self.entries())
+
+    def path(self, curve_key: tuple,
+             window: tuple[float, float, float, float],
+             units: tuple[int, int]) -> str:
+        """
+        Returns the cache file path of a curve sampled for a window.
+
+        :param curve_key: The curve_key of the graph.
+        :param window: (x_min, x_max, y_min, y_max) world window sampled.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: Path of the .npy file.
+        """
+        settings = (CACHE_VERSION, samples_per_pixel, chunk_size,
+                    adaptive_step, adaptive_tolerance, adaptive_depth,
+                    discontinuity_jump, implicit_step, implicit_depth)
+        digest = hashlib.sha1(
+            repr((curve_key, window, units, settings)).encode()).hexdigest()
+        return os.path.join(self.directory, digest + ".npy")
+
+    def load(self, curve_key: tuple,
+             window: tuple[float, float, float, float],
+             units: tuple[int, int]) -> np.ndarray:
+        """
+        Memory-maps cached samples, marking the file as recently used.
+
+        :param curve_key: The curve_key of the graph.
+        :param window: (x_min, x_max, y_min, y_max) world window sampled.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :return: A read-only (N, 2) array of world (x, y) rows, or None
+                 if not cached.
+        """
+        path = self.path(curve_key, window, units)
+        try:
+            points = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if points.ndim != 2 or points.shape[1] != 2:
+            return None
+        return points
+
+    def save(self, curve_key: tuple,
+             window: tuple[float, float, float, float],
+             units: tuple[int, int],
+             samples: tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Writes samples to the cache and evicts files once the running
+        total exceeds the budget.
+        Failing to write is not an error; the samples are just not cached.
+
+        :param curve_key: The curve_key of the graph.
+        :param window: (x_min, x_max, y_min, y_max) world window sampled.
+        :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+        :param samples: (x, y) world arrays.
+        """
+        path = self.path(curve_key, window, units)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, mode="wb") as file:
+                np.save(file, np.column_stack(samples).astype(np.float64))
+            size = os.path.getsize(temporary)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temporary, path)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return
+        with self.lock:
+            self.size += size - replaced
+            over_budget = self.size > self.budget
+        if over_budget:
+            self.evict()
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        """
+        Lists the cache files.
+
+        :return: (modification time, size, path) of every .npy file.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        """Deletes the least recently used files until the cache fits into
+        its budget, measuring the directory again to correct the running
+        total for files other processes wrote or deleted."""
+        with self.lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.budget:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self.size = total
@@ -0,0 +1,152 @@
+from typing import Callable, Tuple
+
+import numpy as np
+
+Curve = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+def chord_deviation(x_a: np.ndarray, y_a: np.ndarray,
+                    x_b: np.ndarray, y_b: np.ndarray,
+                    x_m: np.ndarray, y_m: np.ndarray,
+                    units: tuple[float, float]) -> np.ndarray:
+    """
+    Computes the pixel distance from midpoints to the chords between
+    interval ends.
+
+    :param x_a: World x of the interval starts.
+    :param y_a: World y of the interval starts.
+    :param x_b: World x of the interval ends.
+    :param y_b: World y of the interval ends.
+    :param x_m: World x of the interval midpoints.
+    :param y_m: World y of the interval midpoints.
+    :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+    :return: Distance in pixels from each midpoint to its chord segment.
+    """
+    x_unit, y_unit = units
+    chord_x = (x_b - x_a) * x_unit
+    chord_y = (y_b - y_a) * y_unit
+    mid_x = (x_m - x_a) * x_unit
+    mid_y = (y_m - y_a) * y_unit
+    length = chord_x ** 2 + chord_y ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        position = np.clip((mid_x * chord_x + mid_y * chord_y) / length, 0, 1)
+    position = np.where(length > 0, position, 0)
+    return np.hypot(mid_x - position * chord_x, mid_y - position * chord_y)
+
+
+def chord_length(x_a: np.ndarray, y_a: np.ndarray,
+                 x_b: np.ndarray, y_b: np.ndarray,
+                 units: tuple[float, float]) -> np.ndarray:
+    """
+    Computes the pixel length of the chords between interval ends.
+
+    :param x_a: World x of the interval starts.
+    :param y_a: World y of the interval starts.
+    :param x_b: World x of the interval ends.
+    :param y_b: World y of the interval ends.
+    :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+    :return: Chord lengths in pixels.
+    """
+    return np.hypot((x_b - x_a) * units[0], (y_b - y_a) * units[1])
+
+
+def outside(x_a: np.ndarray, y_a: np.ndarray,
+            x_b: np.ndarray, y_b: np.ndarray,
+            x_m: np.ndarray, y_m: np.ndarray,
+            window: tuple[float, float, float, float]) -> np.ndarray:
+    """
+    Finds intervals whose ends and midpoint all lie beyond the same edge
+    of the window.
+
+    :param x_a: World x of the interval starts.
+    :param y_a: World y of the interval starts.
+    :param x_b: World x of the interval ends.
+    :param y_b: World y of the interval ends.
+    :param x_m: World x of the interval midpoints.
+    :param y_m: World y of the interval midpoints.
+    :param window: (x_min, x_max, y_min, y_max) world window.
+    :return: Boolean mask of the intervals outside the window.
+    """
+    x_min, x_max, y_min, y_max = window
+    return (((x_a < x_min) & (x_b < x_min) & (x_m < x_min))
+            | ((x_a > x_max) & (x_b > x_max) & (x_m > x_max))
+            | ((y_a < y_min) & (y_b < y_min) & (y_m < y_min))
+            | ((y_a > y_max) & (y_b > y_max) & (y_m > y_max)))
+
+
+def refine(function: Curve, params: np.ndarray, units: tuple[float, float],
+           window: tuple[float, float, float, float], tolerance: float,
+           max_depth: int, jump: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Adaptively samples a curve, bisecting only the intervals whose midpoint
+    deviates from the straight chord by more than the tolerance or whose
+    chord is longer than `jump` pixels.
+
+    All intervals of one refinement level are evaluated in a single call,
+    and intervals lying entirely outside the window are not refined.
+    The result contains NaN wherever the curve is not finite and between
+    samples that still jump by more than `jump` pixels at the maximum
+    depth, so that a polyline drawn through it breaks at poles and
+    discontinuities.
+
+    :param function: Maps a parameter array to (x, y) world arrays.
+    :param params: Initial increasing parameter values.
+    :param units: (x_unit, y_unit) pixel-to-unit ratios for x and y.
+    :param window: (x_min, x_max, y_min, y_max) world window to refine in.
+    :param tolerance: Maximum allowed chord deviation in pixels.
+    :param max_depth: Maximum number of bisections of an initial interval.
+    :param jump: Chord length in pixels treated as a discontinuity once
+                 the maximum depth is reached.
+    :return: (x, y) world arrays.
+    """
+    params = np.asarray(params, dtype=np.float64)
+    x, y = function(params)
+    finite = np.isfinite(x) & np.isfinite(y)
+    active = np.ones(max(len(params) - 1, 0), dtype=bool)
+
+    for _ in range(max_depth):
+        intervals = np.flatnonzero(active)
+        if not len(intervals):
+            break
+        mid = (params[intervals] + params[intervals + 1]) / 2
+        x_m, y_m = function(mid)
+        finite_m = np.isfinite(x_m) & np.isfinite(y_m)
+        finite_a = finite[intervals]
+        finite_b = finite[intervals + 1]
+
+        deviation = chord_deviation(
+            x[intervals], y[intervals], x[intervals + 1], y[intervals + 1],
+            x_m, y_m, units)
+        chord = chord_length(x[intervals], y[intervals],
+                             x[intervals + 1], y[intervals + 1], units)
+        all_finite = finite_a & finite_b & finite_m
+        # Long chords are bisected even when straight so that jumps are
+        # narrowed down; mixed finite/non-finite intervals are bisected to
+        # localize the edge of the domain; fully non-finite ones are dropped
+        mixed = ~all_finite & (finite_a | finite_b | finite_m)
+        split = np.where(all_finite,
+                         (deviation > tolerance) | (chord > jump), mixed)
+        split &= ~outside(x[intervals], y[intervals], x[intervals + 1],
+                          y[intervals + 1], x_m, y_m, window)
+
+        split_intervals = intervals[split]
+        positions = split_intervals + 1
+        params = np.insert(params, positions, mid[split])
+        x = np.insert(x, positions, x_m[split])
+        y = np.insert(y, positions, y_m[split])
+        finite = np.insert(finite, positions, finite_m[split])
+
+        active = np.zeros(len(params) - 1, dtype=bool)
+        first_half = split_intervals + np.arange(len(split_intervals))
+        active[first_half] = True
+        active[first_half + 1] = True
+
+    # Intervals that never converged and still jump are discontinuities
+    intervals = np.flatnonzero(active & finite[:-1] & finite[1:])
+    chord = chord_length(x[intervals], y[intervals],
+                         x[intervals + 1], y[intervals + 1], units)
+    cuts = intervals[chord > jump] + 1
+
+    x = np.where(finite, x, np.nan)
+    y = np.where(finite, y, np.nan)
+    return np.insert(x, cuts, np.nan), np.insert(y, cuts, np.nan)
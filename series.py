@@ -0,0 +1,159 @@
+import os
+import warnings
+
+import numpy as np
+
+# Points per block of the finest pyramid level, blocks merged per coarser
+# level, and rows converted per chunk of a CSV file
+PYRAMID_BASE = 64
+PYRAMID_FACTOR = 4
+CONVERT_ROWS = 1_000_000
+
+
+def convert_csv(csv_path: str, bin_path: str, delimiter: str = ",") -> None:
+    """
+    Converts a CSV file of x, y rows into the raw binary series format,
+    a chunk of rows at a time so that memory use does not grow with the
+    file size. A first row that is not numeric is skipped as a header.
+
+    :param csv_path: Path of the CSV file.
+    :param bin_path: Path of the binary file to write.
+    :param delimiter: Column delimiter of the CSV file.
+    """
+    temporary = bin_path + ".tmp"
+    with open(csv_path, mode="r") as source, \
+            open(temporary, mode="wb") as target:
+        first = source.readline()
+        try:
+            target.write(np.array([float(value) for value in
+                                   first.split(delimiter)[:2]],
+                                  dtype="<f8").tobytes())
+        except ValueError:
+            pass  # A header row, or an empty file
+        with warnings.catch_warnings():
+            # loadtxt warns when it reaches the end of the file
+            warnings.simplefilter("ignore", UserWarning)
+            while True:
+                rows = np.loadtxt(source, delimiter=delimiter,
+                                  usecols=(0, 1), max_rows=CONVERT_ROWS,
+                                  ndmin=2, dtype="<f8")
+                target.write(rows.tobytes())
+                if len(rows) < CONVERT_ROWS:
+                    break
+    os.replace(temporary, bin_path)
+
+
+def open_series(path: str) -> np.ndarray:
+    """
+    Memory-maps a data series, converting a CSV file to a binary file next
+    to it first if the binary file is missing or older. The binary file
+    is named after the whole CSV file name (foo.csv.bin), so that it never
+    replaces a .bin file of the user.
+
+    Binary files hold little-endian float64 (x, y) pairs with x ascending;
+    .npy files of shape (N, 2) are accepted as well.
+
+    :param path: Path of the .bin, .npy or .csv file.
+    :return: A read-only (N, 2) array backed by the file.
+    """
+    if path.endswith(".csv"):
+        bin_path = path + ".bin"
+        if (not os.path.exists(bin_path)
+                or os.path.getmtime(bin_path) < os.path.getmtime(path)):
+            convert_csv(path, bin_path)
+        path = bin_path
+    if path.endswith(".npy"):
+        points = np.load(path, mmap_mode="r")
+    elif os.path.getsize(path) == 0:
+        points = np.empty((0, 2))
+    else:
+        points = np.memmap(path, dtype="<f8", mode="r").reshape(-1, 2)
+    if points.ndim != 2 or points.shape[1] != 2:
+        raise ValueError(f"Expected (x, y) pairs in {path}")
+    return points
+
+
+def build_pyramid(points: np.ndarray) -> list[np.ndarray]:
+    """
+    Builds the min/max pyramid of a series in a single chunked pass.
+
+    Level k holds one row of (first x, min y, max y) per block of
+    PYRAMID_BASE * PYRAMID_FACTOR ** k points.
+
+    :param points: The (N, 2) series.
+    :return: The levels, finest first.
+    """
+    block = PYRAMID_BASE
+    chunk = block * (CONVERT_ROWS // block)
+    parts = []
+    for start in range(0, len(points), chunk):
+        part = np.asarray(points[start:start + chunk])
+        starts = np.arange(0, len(part), block)
+        parts.append(np.column_stack((part[starts, 0],
+                                      np.fmin.reduceat(part[:, 1], starts),
+                                      np.fmax.reduceat(part[:, 1], starts))))
+    levels = [np.concatenate(parts) if parts else np.empty((0, 3))]
+    while len(levels[-1]) > PYRAMID_FACTOR:
+        level = levels[-1]
+        starts = np.arange(0, len(level), PYRAMID_FACTOR)
+        levels.append(np.column_stack(
+            (level[starts, 0], np.fmin.reduceat(level[:, 1], starts),
+             np.fmax.reduceat(level[:, 2], starts))))
+    return levels
+
+
+def find_index(points: np.ndarray, pyramid: list[np.ndarray], x: float,
+               side: str) -> int:
+    """
+    Binary searches the sorted x of a series, first in the finest pyramid
+    level and then within one block, so that only a block of the file is
+    read.
+
+    :param points: The (N, 2) series, x ascending.
+    :param pyramid: Levels returned by build_pyramid.
+    :param x: The x value to find.
+    :param side: "left" or "right", as for np.searchsorted.
+    :return: The insertion index of x.
+    """
+    block = max(int(np.searchsorted(pyramid[0][:, 0], x, side="right")) - 1,
+                0)
+    start = block * PYRAMID_BASE
+    x_block = np.array(points[start:start + PYRAMID_BASE, 0])
+    return start + int(np.searchsorted(x_block, x, side=side))
+
+
+def decimate_series(points: np.ndarray, pyramid: list[np.ndarray],
+                    x_min: float, x_max: float,
+                    columns: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Picks the points of a series needed to draw an x range at a given
+    number of pixel columns: the raw points if there are few enough,
+    otherwise the lowest and highest y of every block of the coarsest
+    pyramid level that still has about two blocks per column.
+
+    :param points: The (N, 2) series, x ascending.
+    :param pyramid: Levels returned by build_pyramid.
+    :param x_min: Left end of the x range.
+    :param x_max: Right end of the x range.
+    :param columns: Number of pixel columns the range covers.
+    :return: (x, y) world arrays.
+    """
+    if not len(points):
+        return np.empty(0), np.empty(0)
+    first = max(find_index(points, pyramid, x_min, "left") - 1, 0)
+    last = min(find_index(points, pyramid, x_max, "right") + 1, len(points))
+    count = last - first
+    if count <= 2 * PYRAMID_BASE * max(columns, 1):
+        part = np.array(points[first:last], dtype=np.float64)
+        return part[:, 0], part[:, 1]
+
+    block = PYRAMID_BASE
+    level = 0
+    while (level + 1 < len(pyramid)
+           and count / (block * PYRAMID_FACTOR) >= 2 * columns):
+        block *= PYRAMID_FACTOR
+        level += 1
+    rows = pyramid[level][first // block:(last - 1) // block + 1]
+    x_values = np.repeat(rows[:, 0], 2)
+    y_values = rows[:, 1:].ravel()
+    return x_values, y_values
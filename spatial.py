@@ -0,0 +1,139 @@
+import math
+
+import numpy as np
+
+from constants import index_grid, index_cells
+
+Box = tuple[float, float, float, float]
+
+# Bounds of a curve that may reach anywhere, e.g., an implicit curve
+UNBOUNDED = (-math.inf, math.inf, -math.inf, math.inf)
+
+
+def overlapping(boxes: np.ndarray, window: Box) -> np.ndarray:
+    """
+    Tests world-space boxes against a window.
+
+    :param boxes: (N, 4) array of (x_min, x_max, y_min, y_max) rows.
+    :param window: (x_min, x_max, y_min, y_max) world window.
+    :return: Boolean mask of the boxes that intersect the window.
+    """
+    x_min, x_max, y_min, y_max = window
+    return ((boxes[:, 0] <= x_max) & (boxes[:, 1] >= x_min)
+            & (boxes[:, 2] <= y_max) & (boxes[:, 3] >= y_min))
+
+
+class GridIndex:
+    """Finds the boxes that intersect a window through a uniform grid.
+
+    Every finite box is listed under each grid cell it overlaps, in flat
+    arrays sorted by cell, so that a query reads only the cells under the
+    window and tests just the boxes found there. Boxes reaching to
+    infinity or spanning more than index_cells cells are tested against
+    every query instead; empty boxes are never returned."""
+
+    def __init__(self, boxes: np.ndarray, grid: int = index_grid,
+                 max_cells: int = index_cells) -> None:
+        """
+        Builds the index.
+
+        :param boxes: (N, 4) array of (x_min, x_max, y_min, y_max) rows.
+        :param grid: Maximum number of grid cells along each axis.
+        :param max_cells: Maximum number of cells a box is listed under.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        boxes = self.boxes
+        valid = (boxes[:, 0] <= boxes[:, 1]) & (boxes[:, 2] <= boxes[:, 3])
+        gridded = valid & np.isfinite(boxes).all(axis=1)
+
+        self.origin = (0.0, 0.0)
+        self.cell = (1.0, 1.0)
+        self.columns = self.rows = 0
+        self.starts = np.zeros(1, dtype=np.intp)
+        self.items = np.empty(0, dtype=np.intp)
+
+        listed = np.flatnonzero(gridded)
+        if len(listed):
+            x_min, y_min = boxes[listed][:, [0, 2]].min(axis=0)
+            x_max, y_max = boxes[listed][:, [1, 3]].max(axis=0)
+            widths = boxes[listed, 1] - boxes[listed, 0]
+            heights = boxes[listed, 3] - boxes[listed, 2]
+            # Cells about the size of a typical box, but not too many
+            cell_x = max(np.median(widths), (x_max - x_min) / grid) or 1.0
+            cell_y = max(np.median(heights), (y_max - y_min) / grid) or 1.0
+            self.origin = (x_min, y_min)
+            self.cell = (cell_x, cell_y)
+            self.columns = int((x_max - x_min) // cell_x) + 1
+            self.rows = int((y_max - y_min) // cell_y) + 1
+
+            first_x, last_x = self.cell_range(boxes[listed, 0],
+                                              boxes[listed, 1], 0)
+            first_y, last_y = self.cell_range(boxes[listed, 2],
+                                              boxes[listed, 3], 1)
+            spans_x = last_x - first_x + 1
+            counts = spans_x * (last_y - first_y + 1)
+            small = counts <= max_cells
+            gridded[listed[~small]] = False
+            listed = listed[small]
+            first_x, first_y = first_x[small], first_y[small]
+            spans_x, counts = spans_x[small], counts[small]
+
+            # One entry per (box, cell) pair, numbered row by row
+            entry = np.repeat(np.arange(len(listed)), counts)
+            offset = np.arange(len(entry)) - np.repeat(
+                np.cumsum(counts) - counts, counts)
+            cells = ((first_y[entry] + offset // spans_x[entry])
+                     * self.columns + first_x[entry] + offset % spans_x[entry])
+            order = np.argsort(cells, kind="stable")
+            self.items = listed[entry[order]]
+            self.starts = np.concatenate(([0], np.cumsum(np.bincount(
+                cells, minlength=self.columns * self.rows))))
+
+        self.others = np.flatnonzero(valid & ~gridded)
+
+    def cell_range(self, low: np.ndarray, high: np.ndarray,
+                   axis: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the grid cells covering intervals along one axis.
+
+        :param low: Lower ends of the intervals.
+        :param high: Upper ends of the intervals.
+        :param axis: 0 for x, 1 for y.
+        :return: First and last cell indices, clipped to the grid.
+        """
+        size = self.columns if axis == 0 else self.rows
+        first = np.floor((low - self.origin[axis]) / self.cell[axis])
+        last = np.floor((high - self.origin[axis]) / self.cell[axis])
+        return (np.clip(first, 0, size - 1).astype(np.intp),
+                np.clip(last, 0, size - 1).astype(np.intp))
+
+    def query(self, window: Box) -> np.ndarray:
+        """
+        Finds the boxes that intersect a window.
+
+        :param window: (x_min, x_max, y_min, y_max) world window.
+        :return: Ascending indices of the intersecting boxes.
+        """
+        x_min, x_max, y_min, y_max = window
+        candidates = [self.others]
+        x_0, y_0 = self.origin
+        if (self.columns and x_max >= x_0 and y_max >= y_0
+                and x_min <= x_0 + self.columns * self.cell[0]
+                and y_min <= y_0 + self.rows * self.cell[1]):
+            first_x, last_x = self.cell_range(np.array([x_min]),
+                                              np.array([x_max]), 0)
+            first_y, last_y = self.cell_range(np.array([y_min]),
+                                              np.array([y_max]), 1)
+            cells = (np.arange(first_y[0], last_y[0] + 1)[:, None]
+                     * self.columns
+                     + np.arange(first_x[0], last_x[0] + 1)).ravel()
+            if len(cells) >= len(self.items):
+                candidates.append(self.items)
+            else:
+                starts = self.starts[cells]
+                counts = self.starts[cells + 1] - starts
+                positions = np.arange(counts.sum()) + np.repeat(
+                    starts - (np.cumsum(counts) - counts), counts)
+                candidates.append(self.items[positions])
+        candidates = np.unique(np.concatenate(candidates))
+        return candidates[overlapping(self.boxes[candidates], window)]
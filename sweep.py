@@ -0,0 +1,186 @@
+from typing import Dict, List, Optional, Tuple
+
+import pygame as pg
+
+from constants import BLACK, BLUE, WHITE, sweep_period, sweep_steps
+from graphs import Graph
+
+
+class Sweep:
+    """Holds the values of the free parameters declared in the definitions
+    and animates the selected one back and forth across its range.
+
+    Parameters are shared by name, so every graph using "a" follows the
+    same value, and a parameter declared with different ranges sweeps
+    across all of them. The selected parameter is shown as a slider at
+    the bottom of the window, which can also be dragged with the mouse."""
+
+    def __init__(self, period: float = sweep_period) -> None:
+        """
+        Initializes a sweep without parameters.
+
+        :param period: Seconds to sweep from the low end of a range to
+                       the high end and back.
+        """
+        self.period = period
+        self.ranges: Dict[str, Tuple[float, float]] = {}
+        self.values: Dict[str, float] = {}
+        self.selected = 0
+        self.playing = False
+        self.direction = 1
+
+        self.font = None
+        self.rect: Optional[pg.Rect] = None
+        self.dragging = False
+
+    def update(self, graphs: List[Graph]) -> None:
+        """
+        Collects the parameters of the graphs, keeping the values of those
+        that were declared before.
+
+        :param graphs: The graphs of the scene.
+        """
+        ranges = {}
+        for graph in graphs:
+            for name, low, high in graph.parameters:
+                if name in ranges:
+                    low = min(low, ranges[name][0])
+                    high = max(high, ranges[name][1])
+                ranges[name] = low, high
+        self.ranges = ranges
+        self.values = {name: min(max(self.values.get(name, low), low), high)
+                       for name, (low, high) in ranges.items()}
+        self.selected = min(self.selected, max(len(ranges) - 1, 0))
+        if not ranges:
+            self.playing = False
+            self.rect = None
+
+    @property
+    def name(self) -> Optional[str]:
+        """Returns the name of the selected parameter, if any."""
+        names = list(self.ranges)
+        return names[self.selected] if names else None
+
+    def set_value(self, value: float) -> bool:
+        """
+        Moves the selected parameter, clamped to its range.
+
+        :param value: The new value.
+        :return: True if the value has changed.
+        """
+        low, high = self.ranges[self.name]
+        value = min(max(value, low), high)
+        changed = value != self.values[self.name]
+        self.values[self.name] = value
+        return changed
+
+    def advance(self, elapsed: float) -> bool:
+        """
+        Moves the selected parameter on while the sweep is playing,
+        turning around at the ends of its range.
+
+        :param elapsed: Seconds since the previous step.
+        :return: True if the value has changed.
+        """
+        if not self.playing or self.name is None:
+            return False
+        low, high = self.ranges[self.name]
+        value = (self.values[self.name]
+                 + self.direction * 2 * (high - low) * elapsed / self.period)
+        if value > high:
+            value = 2 * high - value
+            self.direction = -1
+        elif value < low:
+            value = 2 * low - value
+            self.direction = 1
+        return self.set_value(value)
+
+    def toggle(self) -> bool:
+        """
+        Starts or pauses the sweep.
+
+        :return: True if there is a slider to redraw.
+        """
+        self.playing = not self.playing and self.name is not None
+        return self.name is not None
+
+    def select_next(self) -> bool:
+        """
+        Selects the next parameter for the sweep and the slider.
+
+        :return: True if there is a slider to redraw.
+        """
+        if self.name is None:
+            return False
+        self.selected = (self.selected + 1) % len(self.ranges)
+        return True
+
+    def nudge(self, steps: int) -> bool:
+        """
+        Moves the selected parameter by a number of sweep_steps-ths of its
+        range.
+
+        :param steps: Number of steps, negative to move down.
+        :return: True if the value has changed.
+        """
+        if self.name is None:
+            return False
+        low, high = self.ranges[self.name]
+        return self.set_value(self.values[self.name]
+                              + steps * (high - low) / sweep_steps)
+
+    def track(self) -> pg.Rect:
+        """Returns the part of the slider the value is mapped onto."""
+        return pg.Rect(self.rect.x + 10, self.rect.bottom - 10,
+                       self.rect.width - 20, 1)
+
+    def hit(self, position: Tuple[int, int]) -> bool:
+        """
+        Checks whether a screen position is on the slider.
+
+        :param position: (x, y) position in pixels.
+        :return: True if the slider is shown and contains the position.
+        """
+        return self.rect is not None and self.rect.collidepoint(position)
+
+    def drag(self, position: Tuple[int, int]) -> bool:
+        """
+        Moves the selected parameter to the slider position under the
+        mouse.
+
+        :param position: (x, y) mouse position in pixels.
+        :return: True if the value has changed.
+        """
+        track = self.track()
+        low, high = self.ranges[self.name]
+        fraction = (position[0] - track.left) / track.width
+        return self.set_value(low + fraction * (high - low))
+
+    def draw(self, surface: pg.Surface) -> None:
+        """
+        Draws the slider of the selected parameter, if there is one.
+
+        :param surface: The surface to draw on.
+        """
+        name = self.name
+        if name is None:
+            return
+        if self.font is None:
+            self.font = pg.font.Font(None, 20)
+        self.rect = pg.Rect(5, surface.get_height() - 45, 300, 40)
+        panel = pg.Surface(self.rect.size)
+        panel.fill(WHITE)
+        panel.set_alpha(210)
+        surface.blit(panel, self.rect)
+
+        low, high = self.ranges[name]
+        value = self.values[name]
+        state = "playing" if self.playing else "paused"
+        label = self.font.render(f"{name} = {value:.4g}  [{low:g}, {high:g}]"
+                                 f"  {state}", True, BLACK)
+        surface.blit(label, (self.rect.x + 10, self.rect.y + 5))
+        track = self.track()
+        pg.draw.line(surface, BLACK, track.topleft, track.topright)
+        fraction = (value - low) / (high - low) if high > low else 0
+        pg.draw.circle(surface, BLUE, (track.left + fraction * track.width,
+                                       track.top), 5)
@@ -0,0 +1,252 @@
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pygame as pg
+
+from classes import CoordinateSystem
+from graphs import Graph, expand_viewport
+from constants import tile_size, tile_budget, tile_margin
+from rendering import clip_to_rect, decimate_polyline, draw_polyline
+from spatial import UNBOUNDED, overlapping
+
+TileKey = tuple[tuple[float, float], int, int]
+
+
+class TileCache:
+    """Caches the curves layer as square tiles of rendered pixels.
+
+    Tiles are keyed by (zoom level, tile x, tile y), where the zoom level
+    is the (x_unit, y_unit) pair and the tile grid is fixed in world
+    pixels, so a tile stays valid while the view pans and can be reused
+    when the view returns to an area or a zoom level. The least recently
+    used tiles are evicted once the cache exceeds its memory budget, and
+    the tiles next to the view in the direction of panning are rendered
+    ahead of time on a background thread."""
+
+    def __init__(self, size: int = tile_size, budget: int = tile_budget,
+                 prefetch: bool = True) -> None:
+        """
+        Initializes an empty cache.
+
+        :param size: Width and height of a tile in pixels.
+        :param budget: Maximum memory used by the tiles in bytes.
+        :param prefetch: Whether to render tiles ahead on a background
+                         thread.
+        """
+        self.size = size
+        self.budget = budget
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.pending = set()
+        self.last_zero = None
+
+        self.worker = ThreadPoolExecutor(max_workers=1) if prefetch \
+            else None
+
+    @property
+    def tile_bytes(self) -> int:
+        """Returns the memory used by one tile in bytes."""
+        return self.size * self.size * 4
+
+    @property
+    def memory(self) -> int:
+        """Returns the memory used by the cached tiles in bytes."""
+        return len(self.tiles) * self.tile_bytes
+
+    def clear(self) -> None:
+        """Drops every tile, e.g., after the graphs have changed."""
+        with self.lock:
+            self.generation += 1
+            self.tiles.clear()
+            self.pending.clear()
+
+    def render_tiles(self, graphs: list[Graph],
+                     keys: list[TileKey]) -> list[pg.Surface]:
+        """
+        Samples the graphs once over the tiles of one zoom level and draws
+        every tile from the same samples, skipping graphs whose bounds are
+        outside the tiles.
+
+        :param graphs: The graphs to draw.
+        :param keys: (units, tile x, tile y) of the tiles, all with the
+                     same units.
+        :return: Transparent surfaces holding the curves of each tile.
+        """
+        units = keys[0][0]
+        x_unit, y_unit = units
+        left = min(tile_x for _, tile_x, _ in keys) * self.size
+        right = (max(tile_x for _, tile_x, _ in keys) + 1) * self.size
+        top = min(tile_y for _, _, tile_y in keys) * self.size
+        bottom = (max(tile_y for _, _, tile_y in keys) + 1) * self.size
+        window = expand_viewport((left / x_unit, right / x_unit,
+                                  -bottom / y_unit, -top / y_unit),
+                                 tile_margin * self.size
+                                 / max(right - left, bottom - top))
+
+        bounds = np.array([UNBOUNDED if graph.bounds is None
+                           else graph.bounds for graph in graphs])
+        graphs = [graphs[index] for index in
+                  np.flatnonzero(overlapping(bounds.reshape(-1, 4), window))]
+
+        surfaces = [pg.Surface((self.size, self.size), pg.SRCALPHA)
+                    for _ in keys]
+        tile_rect = pg.Rect(0, 0, self.size, self.size)
+        for graph in graphs:
+            samples = graph.try_calculate_coordinates(window, units)
+            if samples is None:
+                continue
+            x_values, y_values = decimate_polyline(samples[0] * x_unit,
+                                                   -samples[1] * y_unit)
+            for surface, (_, tile_x, tile_y) in zip(surfaces, keys):
+                x_tile, y_tile = clip_to_rect(x_values - tile_x * self.size,
+                                              y_values - tile_y * self.size,
+                                              tile_rect)
+                draw_polyline(surface, graph.color, x_tile, y_tile)
+        return surfaces
+
+    def store(self, generation: int, keys: list[TileKey],
+              surfaces: list[pg.Surface]) -> None:
+        """
+        Adds rendered tiles unless the cache was cleared since they were
+        requested, then evicts tiles over the memory budget.
+
+        :param generation: The cache generation the tiles were rendered
+                           for.
+        :param keys: (units, tile x, tile y) of the tiles.
+        :param surfaces: The rendered tiles.
+        """
+        with self.lock:
+            self.pending.difference_update(keys)
+            if generation != self.generation:
+                return
+            for key, surface in zip(keys, surfaces):
+                self.tiles[key] = surface
+                self.tiles.move_to_end(key)
+            while len(self.tiles) > len(keys) and self.memory > self.budget:
+                self.tiles.popitem(last=False)
+
+    def get(self, graphs: list[Graph],
+            keys: list[TileKey]) -> list[pg.Surface]:
+        """
+        Returns tiles, rendering those that are not cached in one batch.
+
+        :param graphs: The graphs to draw.
+        :param keys: (units, tile x, tile y) of the tiles.
+        :return: The tile surfaces.
+        """
+        with self.lock:
+            tiles = {}
+            for key in keys:
+                surface = self.tiles.get(key)
+                if surface is not None:
+                    self.tiles.move_to_end(key)
+                    tiles[key] = surface
+            generation = self.generation
+        missing = [key for key in keys if key not in tiles]
+        if missing:
+            surfaces = self.render_tiles(graphs, missing)
+            self.store(generation, missing, surfaces)
+            tiles.update(zip(missing, surfaces))
+        return [tiles[key] for key in keys]
+
+    def prefetch(self, graphs: list[Graph], keys: list[TileKey]) -> None:
+        """
+        Renders the given tiles on the background thread, skipping those
+        that are cached or already requested.
+
+        :param graphs: The graphs to draw.
+        :param keys: Keys of the tiles to render ahead.
+        """
+        with self.lock:
+            keys = [key for key in keys
+                    if key not in self.tiles and key not in self.pending]
+            self.pending.update(keys)
+            generation = self.generation
+        if keys:
+            self.worker.submit(self.prefetch_tiles, generation, graphs, keys)
+
+    def prefetch_tiles(self, generation: int, graphs: list[Graph],
+                       keys: list[TileKey]) -> None:
+        """Renders and stores tiles on the background thread."""
+        if generation != self.generation:
+            return
+        self.store(generation, keys, self.render_tiles(graphs, keys))
+
+    def tile_range(self, axes: CoordinateSystem,
+                   rect: pg.Rect) -> tuple[range, range]:
+        """
+        Finds the tiles covering a rectangle of the screen.
+
+        :param axes: The CoordinateSystem object representing the current
+                     grid and axes.
+        :param rect: The screen rectangle in pixels.
+        :return: Ranges of the tile x and tile y indices.
+        """
+        first_x = math.floor((rect.left - axes.x_0) / self.size)
+        last_x = math.floor((rect.right - 1 - axes.x_0) / self.size)
+        first_y = math.floor((rect.top - axes.y_0) / self.size)
+        last_y = math.floor((rect.bottom - 1 - axes.y_0) / self.size)
+        return range(first_x, last_x + 1), range(first_y, last_y + 1)
+
+    def ahead(self, axes: CoordinateSystem, columns: range,
+              rows: range) -> list[TileKey]:
+        """
+        Lists the tiles just outside the view in the direction the view
+        has moved since the last frame.
+
+        :param axes: The CoordinateSystem object representing the current
+                     grid and axes.
+        :param columns: Tile x indices of the view.
+        :param rows: Tile y indices of the view.
+        :return: Keys of the tiles to prefetch.
+        """
+        if self.last_zero is None:
+            return []
+        # The origin moves opposite to the view
+        dx = np.sign(axes.x_0 - self.last_zero[0])
+        dy = np.sign(axes.y_0 - self.last_zero[1])
+        keys = []
+        if dx:
+            column = columns[0] - 1 if dx > 0 else columns[-1] + 1
+            keys += [(axes.units, column, row) for row in rows]
+        if dy:
+            row = rows[0] - 1 if dy > 0 else rows[-1] + 1
+            keys += [(axes.units, column, row) for column in columns]
+        return keys
+
+    def draw(self, axes: CoordinateSystem, graphs: list[Graph],
+             surface: pg.Surface, rect: pg.Rect = None) -> None:
+        """
+        Blits the tiles covering the view, or a part of it, and prefetches
+        the tiles ahead of the panning direction.
+
+        :param axes: The CoordinateSystem object representing the current
+                     grid and axes.
+        :param graphs: The graphs to draw.
+        :param surface: The surface to draw on.
+        :param rect: Optional screen rectangle; only the tiles overlapping
+                     it are blitted, and the caller clips the surface.
+        """
+        view = pg.Rect(0, 0, axes.width, axes.height)
+        area = view if rect is None else rect.clip(view)
+        columns, rows = self.tile_range(axes, area)
+        keys = [(axes.units, tile_x, tile_y)
+                for tile_x in columns for tile_y in rows]
+        for (_, tile_x, tile_y), tile in zip(keys, self.get(graphs, keys)):
+            surface.blit(tile, (axes.x_0 + tile_x * self.size,
+                                axes.y_0 + tile_y * self.size))
+
+        if self.worker is not None:
+            self.prefetch(graphs, self.ahead(axes, *self.tile_range(axes,
+                                                                    view)))
+        self.last_zero = axes.zero
+
+    def close(self) -> None:
+        """Stops the background thread."""
+        if self.worker is not None:
+            self.clear()
+            self.worker.shutdown(cancel_futures=True)